@@ -0,0 +1,276 @@
+from array import array
+from typing import List
+
+import QuadTreeHelpers as quadtree_helpers
+from Point import Point
+from QuadTree import QuadTree
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+_NO_NODE = -1
+
+
+def iter_range_query(xs, ys, sons, root: int, xmin, ymin, xmax, ymax):
+    # Works on any indexable node buffers (arrays, memoryviews, mapped files) laid out as in ArrayQuadTree.
+    if root == _NO_NODE:
+        return
+    pending = [root]
+    while pending:
+        node = pending.pop()
+        x, y = xs[node], ys[node]
+        if xmin <= x <= xmax and ymin <= y <= ymax:
+            yield node
+        base = 4 * node
+        for son_idx in quadtree_helpers.overlapped_quadrants(x, y, xmin, ymin, xmax, ymax):
+            if sons[base + son_idx] != _NO_NODE:
+                pending.append(sons[base + son_idx])
+
+
+def search_node(xs, ys, sons, root: int, x, y) -> int:
+    node = root
+    while node != _NO_NODE:
+        nx, ny = xs[node], ys[node]
+        if nx == x and ny == y:
+            return node
+        node = sons[4 * node + ArrayQuadTree._direction(x, y, nx, ny)]
+    return _NO_NODE
+
+
+class ArrayQuadTree:
+    # Point quadtree with the same shape as QuadTree, stored in parallel typed arrays: node i keeps its
+    # point in xs[i], ys[i] and its sons in sons[4 * i: 4 * i + 4] (TOPLEFT, TOPRIGHT, BOTTOMRIGHT, BOTTOMLEFT),
+    # which is 32 bytes per node. Deleted slots go to a free list and are reused by later inserts.
+    # It offers the insert, search, delete and range query methods of QuadTree and builds the same shapes, but there
+    # are no node objects: search returns a Point holding the stored coordinates, or None. Payloads, lazy deletion
+    # and the nearest-neighbour queries are only available on QuadTree.
+    _TOPLEFT = 0
+    _TOPRIGHT = 1
+    _BOTTOMRIGHT = 2
+    _BOTTOMLEFT = 3
+
+    def __init__(self):
+        self._xs = array('d')
+        self._ys = array('d')
+        self._sons = array('i')
+        self._free = array('i')
+        self._root = _NO_NODE
+        self._count = 0
+
+    @classmethod
+    def from_points(cls, points) -> 'ArrayQuadTree':
+        xs, ys = quadtree_helpers.sorted_coordinates(points)
+        aqt = cls()
+        if not xs:
+            return aqt
+        order, masks = quadtree_helpers.balanced_shape(xs, ys)
+        if np is not None:
+            preorder = np.frombuffer(order, dtype=np.intc)
+            aqt._xs = quadtree_helpers._typed('d', np.frombuffer(xs)[preorder])
+            aqt._ys = quadtree_helpers._typed('d', np.frombuffer(ys)[preorder])
+        else:
+            aqt._xs = array('d', (xs[idx] for idx in order))
+            aqt._ys = array('d', (ys[idx] for idx in order))
+        aqt._sons = array('i', [_NO_NODE]) * (4 * len(order))
+        for node, (parent, child_idx) in enumerate(quadtree_helpers.iter_shape_links(masks), 1):
+            aqt._sons[4 * parent + child_idx] = node
+        aqt._root = 0
+        aqt._count = len(xs)
+        return aqt
+
+    @classmethod
+    def from_quadtree(cls, qt) -> 'ArrayQuadTree':
+        qt = qt._live_tree()
+        aqt = cls()
+        if not qt.point:
+            return aqt
+        aqt._root = aqt._new_node(qt.point.x, qt.point.y)
+        pending = [(qt, aqt._root)]
+        while pending:
+            node, idx = pending.pop()
+            for child_idx, son in enumerate(node.sons):
+                if son:
+                    son_idx = aqt._new_node(son.point.x, son.point.y)
+                    aqt._sons[4 * idx + child_idx] = son_idx
+                    pending.append((son, son_idx))
+        aqt._count = len(aqt._xs)
+        return aqt
+
+    def __len__(self):
+        return self._count
+
+    def insert(self, p: Point):
+        if self._root == _NO_NODE:
+            self._root = self._new_node(p.x, p.y)
+            self._count += 1
+        elif self._insert_from(self._root, p.x, p.y):
+            self._count += 1
+
+    def search(self, p: Point):
+        node = search_node(self._xs, self._ys, self._sons, self._root, p.x, p.y)
+        if node == _NO_NODE:
+            return None
+        return Point(self._xs[node], self._ys[node])
+
+    def delete_with_full_reinsertion(self, p: Point):
+        parent, node, child_idx = self._find_with_parent(p.x, p.y)
+        if node == _NO_NODE:
+            return
+        self._count -= 1
+        self._remove_with_full_reinsertion(node, parent, child_idx)
+
+    def delete_with_partial_reinsertion(self, p: Point):
+        # QuadTree.delete_with_partial_reinsertion on the index buffers, with the same candidate choice and
+        # crosshatched region, so both engines end with the same shapes.
+        parent, node, child_idx = self._find_with_parent(p.x, p.y)
+        if node == _NO_NODE:
+            return
+        self._count -= 1
+        xs, ys, sons = self._xs, self._ys, self._sons
+        sons_of_node = sons[4 * node: 4 * node + 4]
+        if all(son == _NO_NODE for son in sons_of_node):
+            self._remove_with_full_reinsertion(node, parent, child_idx)
+            return
+        candidates = [QuadTree._EXTREME_POINTS[quadrant] if son == _NO_NODE
+                      else self._point(self._chain(son, QuadTree._conjugate(quadrant))[-1])
+                      for quadrant, son in enumerate(sons_of_node)]
+        selected_quadrant = QuadTree._select_candidate(candidates, p)
+        spine = self._chain(sons_of_node[selected_quadrant], QuadTree._conjugate(selected_quadrant))
+        selected = spine[-1]
+        sx, sy = xs[selected], ys[selected]
+        if any(xs[n] == sx or ys[n] == sy for n in spine[:-1]):
+            # Ties with the candidate fall back to full reinsertion, see QuadTree._spine_has_ties.
+            self._remove_with_full_reinsertion(node, parent, child_idx)
+            return
+        roots = [(root, adjacent) for root in [node] + spine
+                 for adjacent in QuadTree._get_adjacent_nodes(selected_quadrant)]
+        reinserted = []
+        for subtree in self._collect_crosshatched(roots, p.x, p.y, sx, sy):
+            subtree_nodes = [subtree] + self._child_nodes(subtree)
+            reinserted += [(xs[n], ys[n]) for n in subtree_nodes]
+            self._free.extend(subtree_nodes)
+        if len(spine) > 1:
+            self._remove_with_full_reinsertion(selected, spine[-2], QuadTree._conjugate(selected_quadrant))
+        else:
+            self._remove_with_full_reinsertion(selected, node, selected_quadrant)
+        xs[node], ys[node] = sx, sy
+        for x, y in reinserted:
+            self._insert_from(node, x, y)
+
+    def _find_with_parent(self, x, y):
+        xs, ys, sons = self._xs, self._ys, self._sons
+        parent, node, child_idx = _NO_NODE, self._root, 0
+        while node != _NO_NODE and (xs[node] != x or ys[node] != y):
+            child_idx = self._direction(x, y, xs[node], ys[node])
+            parent, node = node, sons[4 * node + child_idx]
+        return parent, node, child_idx
+
+    def _remove_with_full_reinsertion(self, node: int, parent: int, child_idx: int):
+        xs, ys, sons = self._xs, self._ys, self._sons
+        child_nodes = self._child_nodes(node)
+        child_points = [(xs[c], ys[c]) for c in child_nodes]
+        self._free.extend(child_nodes)
+        for d in range(4):
+            sons[4 * node + d] = _NO_NODE
+        if not child_points:
+            self._free.append(node)
+            if parent == _NO_NODE:
+                self._root = _NO_NODE
+            else:
+                sons[4 * parent + child_idx] = _NO_NODE
+            return
+        xs[node], ys[node] = child_points[0]
+        for x, y in child_points[1:]:
+            self._insert_from(node, x, y)
+
+    def range_query(self, xmin, ymin, xmax, ymax) -> List[Point]:
+        return list(self.iter_range_query(xmin, ymin, xmax, ymax))
+
+    def count_range_query(self, xmin, ymin, xmax, ymax) -> int:
+        return sum(1 for _ in iter_range_query(self._xs, self._ys, self._sons, self._root, xmin, ymin, xmax, ymax))
+
+    def iter_range_query(self, xmin, ymin, xmax, ymax):
+        for node in iter_range_query(self._xs, self._ys, self._sons, self._root, xmin, ymin, xmax, ymax):
+            yield Point(self._xs[node], self._ys[node])
+
+    def __repr__(self):
+        if self._root == _NO_NODE:
+            return 'None: (None, None, None, None)'
+        return quadtree_helpers.repr_tree(self._root, lambda node: Point(self._xs[node], self._ys[node]),
+                         lambda node: self._sons[4 * node: 4 * node + 4], _NO_NODE)
+
+    def _new_node(self, x, y) -> int:
+        if self._free:
+            node = self._free.pop()
+            self._xs[node] = x
+            self._ys[node] = y
+            self._sons[4 * node: 4 * node + 4] = array('i', (_NO_NODE, _NO_NODE, _NO_NODE, _NO_NODE))
+            return node
+        self._xs.append(x)
+        self._ys.append(y)
+        self._sons.extend((_NO_NODE, _NO_NODE, _NO_NODE, _NO_NODE))
+        return len(self._xs) - 1
+
+    def _insert_from(self, node: int, x, y) -> bool:
+        xs, ys, sons = self._xs, self._ys, self._sons
+        while True:
+            nx, ny = xs[node], ys[node]
+            if nx == x and ny == y:
+                return False
+            slot = 4 * node + self._direction(x, y, nx, ny)
+            if sons[slot] == _NO_NODE:
+                sons[slot] = self._new_node(x, y)
+                return True
+            node = sons[slot]
+
+    def _chain(self, node: int, quadrant: int) -> List[int]:
+        # node and its sons towards quadrant, down to the last one.
+        chain = [node]
+        while self._sons[4 * chain[-1] + quadrant] != _NO_NODE:
+            chain.append(self._sons[4 * chain[-1] + quadrant])
+        return chain
+
+    def _collect_crosshatched(self, roots, x, y, selected_x, selected_y) -> List[int]:
+        # QuadTree._collect_crosshatched: cuts the subtrees rooted in the crosshatched region between the deleted
+        # point (x, y) and the candidate from their parents and returns them, in the same order.
+        xs, ys, sons = self._xs, self._ys, self._sons
+        up_bound, bottom_bound = max(y, selected_y), min(y, selected_y)
+        right_bound, left_bound = max(x, selected_x), min(x, selected_x)
+        direction_change = self._direction(selected_x, selected_y, x, y)
+        subtrees = []
+        pending = roots[::-1]
+        while pending:
+            parent, idx = pending.pop()
+            node = sons[4 * parent + idx]
+            if node == _NO_NODE:
+                continue
+            if up_bound > ys[node] >= bottom_bound or left_bound <= xs[node] < right_bound:
+                sons[4 * parent + idx] = _NO_NODE
+                subtrees.append(node)
+            else:
+                direction_point = self._direction(xs[node], ys[node], x, y)
+                pending += [(node, d) for d in (3, 2, 1, 0) if d != direction_change and d != direction_point]
+        return subtrees
+
+    def _point(self, node: int) -> Point:
+        return Point(self._xs[node], self._ys[node])
+
+    def _child_nodes(self, node: int) -> List[int]:
+        # Same order as QuadTree.get_all_child_points, so reinsertions rebuild the same shapes.
+        child_nodes = []
+        pending = [node]
+        while pending:
+            current = pending.pop()
+            sons = [s for s in self._sons[4 * current: 4 * current + 4] if s != _NO_NODE]
+            child_nodes += sons
+            pending += reversed(sons)
+        return child_nodes
+
+    @staticmethod
+    def _direction(x, y, reference_x, reference_y) -> int:
+        if y >= reference_y:
+            return ArrayQuadTree._TOPRIGHT if x >= reference_x else ArrayQuadTree._TOPLEFT
+        else:
+            return ArrayQuadTree._BOTTOMRIGHT if x >= reference_x else ArrayQuadTree._BOTTOMLEFT
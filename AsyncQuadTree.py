@@ -0,0 +1,61 @@
+import asyncio
+import functools
+from typing import List
+
+from Point import Point
+from QuadTree import QuadTree
+
+# Async versions of the QuadTree scans for asyncio services: they run the same traversals as their QuadTree
+# counterparts but hand control back to the event loop every yield_every visited nodes, so one large query does
+# not stall the small ones sharing the loop. The tree must not be modified while a scan is suspended.
+DEFAULT_YIELD_EVERY = 1024
+
+
+async def _cooperate(steps, yield_every: int):
+    # Relays the results of a QuadTree._walk generator, pausing every yield_every steps. A step is a visited node,
+    # or for _walk_nearest also a point it reports.
+    for visited, found in enumerate(steps, 1):
+        if found is not None:
+            yield found
+        if visited % yield_every == 0:
+            await asyncio.sleep(0)
+
+
+def iter_all_points(qt: QuadTree, yield_every: int = DEFAULT_YIELD_EVERY):
+    return _cooperate(qt._walk_points(), yield_every)
+
+
+def iter_range_query(qt: QuadTree, xmin, ymin, xmax, ymax, yield_every: int = DEFAULT_YIELD_EVERY):
+    return _cooperate((node and node.point for node in qt._walk_range_query(xmin, ymin, xmax, ymax)), yield_every)
+
+
+async def range_query(qt: QuadTree, xmin, ymin, xmax, ymax, yield_every: int = DEFAULT_YIELD_EVERY) -> List[Point]:
+    return [point async for point in iter_range_query(qt, xmin, ymin, xmax, ymax, yield_every)]
+
+
+def iter_nearest(qt: QuadTree, p: Point, metric='l2', yield_every: int = DEFAULT_YIELD_EVERY):
+    # Points in increasing distance order, as QuadTree._iter_nearest.
+    return _cooperate((found and found[1] for found in qt._walk_nearest(p, metric)), yield_every)
+
+
+async def nearest(qt: QuadTree, p: Point, k: int = 1, metric='l2',
+                  yield_every: int = DEFAULT_YIELD_EVERY) -> List[Point]:
+    points = []
+    if k <= 0:
+        return points
+    nearest_points = iter_nearest(qt, p, metric, yield_every)
+    try:
+        async for point in nearest_points:
+            points.append(point)
+            if len(points) == k:
+                break
+    finally:
+        await nearest_points.aclose()
+    return points
+
+
+async def offload(function, *args, executor=None, **kwargs):
+    # Runs a whole query, e.g. offload(qt.range_query, 0, 0, 10, 10), in an executor (the loop's default
+    # thread pool when None). With a process pool the bound tree is pickled along with every call.
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, functools.partial(function, *args, **kwargs))
@@ -0,0 +1,137 @@
+from Point import Point
+from QuadTree import QuadTree
+
+
+class AugmentedQuadTree(QuadTree):
+    # Every node also keeps the number of live points in its subtree (size) and their tight bounding box
+    # (bbox, xmin, ymin, xmax, ymax, None when the subtree holds no live point). Inserts update the insertion
+    # path. Deletes refresh the nodes that lose points, bottom up: the ancestors of the removed node and, for
+    # partial reinsertion, the nodes QuadTree followed to find the subtrees it detaches; the reinserted nodes update
+    # their own paths.
+
+    def __init__(self, point: Point = None):
+        super().__init__(point)
+        self.size = 1 if point else 0
+        self.bbox = (point.x, point.y, point.x, point.y) if point else None
+
+    def insert_quadtree(self, qt: 'AugmentedQuadTree'):
+        qt._refresh_subtree()
+        if not self.point:
+            self._adopt(qt)
+            return True
+        path = []
+        node = run_top = self
+        run_idx = None
+        while node.point != qt.point:
+            path.append(node)
+            child_idx = node._select_child(qt.point)
+            if child_idx != run_idx:
+                run_top, run_idx = node, child_idx
+            son = node.sons[child_idx]
+            if son is None:
+                node.sons[child_idx] = qt
+                self._refresh_run(run_top, node, child_idx)
+                self._grow(path, qt.size, qt.bbox)
+                return True
+            node = son
+        if node._deleted:
+            node.point = qt.point
+            node._deleted = False
+            self._deleted_count -= 1
+            path.append(node)
+            self._grow(path, 1, (node.point.x, node.point.y, node.point.x, node.point.y))
+        return False
+
+    @staticmethod
+    def _grow(path, size: int, bbox):
+        if not size:
+            return
+        for node in path:
+            node.size += size
+            node.bbox = node._union(node.bbox, bbox)
+
+    def _adopt(self, qt: 'AugmentedQuadTree'):
+        super()._adopt(qt)
+        self.size = qt.size
+        self.bbox = qt.bbox
+
+    def delete_with_full_reinsertion(self, p: Point):
+        path = self._path_to(p)
+        super().delete_with_full_reinsertion(p)
+        self._refresh_path(path)
+
+    def delete_with_partial_reinsertion(self, p: Point):
+        path = self._path_to(p)
+        super().delete_with_partial_reinsertion(p)
+        self._refresh_path(path)
+
+    def delete_lazy(self, p: Point):
+        path = self._path_to(p)
+        super().delete_lazy(p)
+        # After a rebuild the old path is detached, but refreshing it still leaves the root right: its new
+        # sons already carry their own augmentation.
+        self._refresh_path(path)
+
+    def _node_count(self) -> int:
+        return self.size + self._deleted_count
+
+    def _path_to(self, p: Point):
+        if not self.point:
+            return []
+        path = [self]
+        while path[-1].point != p:
+            son = path[-1].sons[path[-1]._select_child(p)]
+            if son is None:
+                return []
+            path.append(son)
+        return path
+
+    def _refresh_subtree(self):
+        nodes = [self]
+        for node in nodes:
+            nodes += [son for son in node.sons if son]
+        for node in reversed(nodes):
+            node._refresh_node()
+
+    def _refresh_node(self):
+        super()._refresh_node()
+        if self.point and not self._deleted:
+            size, bbox = 1, (self.point.x, self.point.y, self.point.x, self.point.y)
+        else:
+            size, bbox = 0, None
+        for son in self.sons:
+            if son:
+                size += son.size
+                bbox = self._union(bbox, son.bbox)
+        self.size = size
+        self.bbox = bbox
+
+    @staticmethod
+    def _union(bbox, other):
+        if bbox is None:
+            return other
+        if other is None:
+            return bbox
+        return min(bbox[0], other[0]), min(bbox[1], other[1]), max(bbox[2], other[2]), max(bbox[3], other[3])
+
+    def count_range_query(self, xmin, ymin, xmax, ymax) -> int:
+        # Subtrees whose bounding box lies inside the query box are counted whole, disjoint ones are skipped.
+        count = 0
+        pending = [self] if self.size else []
+        while pending:
+            node = pending.pop()
+            bxmin, bymin, bxmax, bymax = node.bbox
+            if bxmax < xmin or bxmin > xmax or bymax < ymin or bymin > ymax:
+                continue
+            if xmin <= bxmin and bxmax <= xmax and ymin <= bymin and bymax <= ymax:
+                count += node.size
+                continue
+            x, y = node.point.x, node.point.y
+            if xmin <= x <= xmax and ymin <= y <= ymax and not node._deleted:
+                count += 1
+            pending += [son for son in node.sons if son and son.size]
+        return count
+
+    def _son_bounds(self, region, idx: int):
+        # The tight box of the son is never larger than its quadrant region and skips empty subtrees.
+        return self.sons[idx].bbox
@@ -0,0 +1,95 @@
+import math
+
+from Point import Point
+from QuadTree import QuadTree
+
+
+class BalancedQuadTree(QuadTree):
+    # Scapegoat-style balancing (Galperin & Rivest): the root counts the nodes of the tree, and an insert that
+    # lands deeper than log(n) / log(1 / alpha) rebuilds, with the median bulk build, the nearest ancestor on its
+    # path that has a son holding more than alpha of its nodes. Physical deletes rebuild the whole tree once it
+    # shrinks below alpha of its largest size since the last rebuild.
+    # Median splits leave at most half of the nodes in a son, so alpha must be in (0.5, 1).
+    alpha = 0.75
+    _node_total = 0
+    _max_size = 0
+
+    # The node count QuadTree keeps on the root; every tree that sets it (bulk builds, load, clone, the parallel
+    # build) thereby also sets the largest size.
+    @property
+    def _known_size(self) -> int:
+        return self._node_total
+
+    @_known_size.setter
+    def _known_size(self, size: int):
+        self._node_total = size
+        if size > self._max_size:
+            self._max_size = size
+
+    def insert(self, p: Point):
+        if not self.point:
+            super().insert(p)
+            return
+        path = []
+        node = run_top = self
+        child_idx = None
+        while node is not None and node.point != p:
+            path.append(node)
+            idx = node._select_child(p)
+            if idx != child_idx:
+                run_top, child_idx = node, idx
+            node = node.sons[idx]
+        if node is not None:
+            if node._deleted:
+                node.point = p
+                node._deleted = False
+                self._deleted_count -= 1
+            return
+        node = type(self)(p)
+        path[-1].sons[child_idx] = node
+        self._refresh_run(run_top, path[-1], child_idx)
+        path.append(node)
+        self._known_size += 1
+        if len(path) > self._height_limit():
+            scapegoat = self._find_scapegoat(path)
+            self._rebuild(scapegoat)
+            self._refresh_path(path[:path.index(scapegoat)])
+
+    def delete_with_full_reinsertion(self, p: Point):
+        super().delete_with_full_reinsertion(p)
+        self._shrink()
+
+    def delete_with_partial_reinsertion(self, p: Point):
+        super().delete_with_partial_reinsertion(p)
+        self._shrink()
+
+    def compact(self):
+        super().compact()
+        self._max_size = self._known_size
+
+    def _height_limit(self) -> int:
+        return int(math.log(self._known_size, 1 / self.alpha)) + 1
+
+    def _find_scapegoat(self, path) -> 'BalancedQuadTree':
+        # Subtree sizes are only computed here, bottom-up along the path, so inserts that keep the tree
+        # balanced pay nothing and the cost of a search is covered by the rebuild that follows it.
+        child, child_size = path[-1], 1
+        for node in reversed(path[:-1]):
+            size = 1 + child_size + sum(1 + len(son.get_all_child_points())
+                                        for son in node.sons if son and son is not child)
+            if child_size > self.alpha * size:
+                return node
+            child, child_size = node, size
+        return self
+
+    def _rebuild(self, node: 'BalancedQuadTree'):
+        nodes = [node] + node.get_all_child_points()
+        live_points = sorted((n.point for n in nodes if not n._deleted), key=lambda pt: (pt.x, pt.y))
+        dead = len(nodes) - len(live_points)
+        node._adopt(type(self)._build_balanced(live_points))
+        self._deleted_count -= dead
+        self._known_size -= dead
+
+    def _shrink(self):
+        if self._known_size < self.alpha * self._max_size:
+            self.compact()
@@ -0,0 +1,148 @@
+import math
+
+import numpy as np
+
+from QuadTree import QuadTree
+
+
+class BatchQuadTree:
+    # Flat NumPy snapshot of a QuadTree that answers whole batches of queries level by level: every
+    # query moves one node down per iteration, and the quadrant choice of the whole batch is computed at once.
+    # Results are indices into `points` (preorder), with -1 for a missing point.
+    _TOPLEFT = QuadTree._TOPLEFT
+    _TOPRIGHT = QuadTree._TOPRIGHT
+    _BOTTOMRIGHT = QuadTree._BOTTOMRIGHT
+    _BOTTOMLEFT = QuadTree._BOTTOMLEFT
+
+    def __init__(self, qt: QuadTree):
+        qt = qt._live_tree()
+        self.points = []
+        sons = []
+        regions = []
+        if qt.point:
+            region = (-math.inf, -math.inf, math.inf, math.inf)
+            pending = [(qt, region, -1, 0)]
+            while pending:
+                node, region, parent, child_idx = pending.pop()
+                idx = len(self.points)
+                self.points.append(node.point)
+                sons.append([-1, -1, -1, -1])
+                regions.append(region)
+                if parent >= 0:
+                    sons[parent][child_idx] = idx
+                for son_idx in (self._BOTTOMLEFT, self._BOTTOMRIGHT, self._TOPRIGHT, self._TOPLEFT):
+                    son = node.sons[son_idx]
+                    if son:
+                        pending.append((son, qt._son_region(region, node.point, son_idx), idx, son_idx))
+        self._xs = np.array([pt.x for pt in self.points], dtype=np.float64)
+        self._ys = np.array([pt.y for pt in self.points], dtype=np.float64)
+        self._sons = np.array(sons, dtype=np.int64).reshape(-1, 4)
+        self._regions = np.array(regions, dtype=np.float64).reshape(-1, 4)
+
+    def __len__(self):
+        return len(self.points)
+
+    @staticmethod
+    def _directions(qx, qy, nx, ny):
+        right = (qx >= nx).astype(np.int64)
+        return np.where(qy >= ny, right, 3 - right)  # TOPLEFT/TOPRIGHT above, BOTTOMLEFT/BOTTOMRIGHT below
+
+    def search_many(self, xs, ys) -> np.ndarray:
+        qx = np.asarray(xs, dtype=np.float64)
+        qy = np.asarray(ys, dtype=np.float64)
+        found = np.full(qx.shape[0], -1, dtype=np.int64)
+        if not self.points:
+            return found
+        active = np.arange(qx.shape[0])
+        nodes = np.zeros(qx.shape[0], dtype=np.int64)
+        while active.size:
+            ax, ay = qx[active], qy[active]
+            nx, ny = self._xs[nodes], self._ys[nodes]
+            hit = (nx == ax) & (ny == ay)
+            found[active[hit]] = nodes[hit]
+            missing = ~hit
+            active, nodes = active[missing], nodes[missing]
+            sons = self._sons[nodes, self._directions(ax[missing], ay[missing], nx[missing], ny[missing])]
+            exists = sons >= 0
+            active, nodes = active[exists], sons[exists]
+        return found
+
+    def range_query_many(self, boxes):
+        # boxes is an (M, 4) array of [xmin, ymin, xmax, ymax]; returns one index array per box.
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        if not self.points or not boxes.shape[0]:
+            return [np.empty(0, dtype=np.int64) for _ in range(boxes.shape[0])]
+        box_ids = np.arange(boxes.shape[0])
+        nodes = np.zeros(boxes.shape[0], dtype=np.int64)
+        hit_boxes, hit_nodes = [], []
+        while box_ids.size:
+            xmin, ymin, xmax, ymax = boxes[box_ids].T
+            x, y = self._xs[nodes], self._ys[nodes]
+            inside = (xmin <= x) & (x <= xmax) & (ymin <= y) & (y <= ymax)
+            hit_boxes.append(box_ids[inside])
+            hit_nodes.append(nodes[inside])
+            left, right = xmin < x, xmax >= x
+            bottom, top = ymin < y, ymax >= y
+            overlaps = {self._TOPLEFT: top & left, self._TOPRIGHT: top & right,
+                        self._BOTTOMRIGHT: bottom & right, self._BOTTOMLEFT: bottom & left}
+            next_boxes, next_nodes = [], []
+            for son_idx, overlap in overlaps.items():
+                sons = self._sons[nodes, son_idx]
+                follow = overlap & (sons >= 0)
+                next_boxes.append(box_ids[follow])
+                next_nodes.append(sons[follow])
+            box_ids, nodes = np.concatenate(next_boxes), np.concatenate(next_nodes)
+        hit_boxes, hit_nodes = np.concatenate(hit_boxes), np.concatenate(hit_nodes)
+        order = np.lexsort((hit_nodes, hit_boxes))
+        hit_boxes, hit_nodes = hit_boxes[order], hit_nodes[order]
+        bounds = np.searchsorted(hit_boxes, np.arange(boxes.shape[0] + 1))
+        return [hit_nodes[bounds[i]:bounds[i + 1]] for i in range(boxes.shape[0])]
+
+    def nearest_many(self, xs, ys, k: int = 1, metric='l2'):
+        # Level-synchronous branch and bound: each query keeps its k best distances and a (query, node) pair
+        # is only expanded while its quadrant region can still beat the k-th one. Returns (indices, distances),
+        # both (M, k), padded with -1 / inf when the tree holds fewer than k points.
+        if metric not in self._METRICS:
+            raise ValueError('Unknown metric ' + repr(metric) + ', expected one of ' + repr(sorted(self._METRICS)))
+        distance = self._METRICS[metric]
+        qx = np.asarray(xs, dtype=np.float64)
+        qy = np.asarray(ys, dtype=np.float64)
+        m = qx.shape[0]
+        best_d = np.full((m, k), np.inf)
+        best_i = np.full((m, k), -1, dtype=np.int64)
+        if not self.points or m == 0 or k == 0:
+            return best_i, best_d
+        queries = np.arange(m)
+        nodes = np.zeros(m, dtype=np.int64)
+        while queries.size:
+            dists = distance(self._xs[nodes] - qx[queries], self._ys[nodes] - qy[queries])
+            all_q = np.concatenate((np.repeat(np.arange(m), k), queries))
+            all_d = np.concatenate((best_d.ravel(), dists))
+            all_i = np.concatenate((best_i.ravel(), nodes))
+            order = np.lexsort((all_d, all_q))
+            all_q, all_d, all_i = all_q[order], all_d[order], all_i[order]
+            rank = np.arange(all_q.size) - np.searchsorted(all_q, all_q)
+            keep = rank < k
+            best_d = all_d[keep].reshape(m, k)
+            best_i = all_i[keep].reshape(m, k)
+
+            next_queries, next_nodes = [], []
+            for son_idx in range(4):
+                sons = self._sons[nodes, son_idx]
+                exists = sons >= 0
+                son_queries, sons = queries[exists], sons[exists]
+                xmin, ymin, xmax, ymax = self._regions[sons].T
+                dx = np.maximum(np.maximum(xmin - qx[son_queries], qx[son_queries] - xmax), 0.)
+                dy = np.maximum(np.maximum(ymin - qy[son_queries], qy[son_queries] - ymax), 0.)
+                promising = distance(dx, dy) < best_d[son_queries, k - 1]
+                next_queries.append(son_queries[promising])
+                next_nodes.append(sons[promising])
+            queries, nodes = np.concatenate(next_queries), np.concatenate(next_nodes)
+        return best_i, best_d
+
+    @staticmethod
+    def _l1_distances(dx, dy):
+        return np.abs(dx) + np.abs(dy)
+
+    # Vectorized counterparts of QuadTree._METRICS, on coordinate differences; custom metrics are not supported.
+    _METRICS = {'l1': _l1_distances.__func__, 'l2': np.hypot}
@@ -0,0 +1,155 @@
+from typing import List
+
+import QuadTreeHelpers as quadtree_helpers
+from ArrayQuadTree import ArrayQuadTree
+from Point import Point
+
+
+class BucketQuadTree:
+    # Bucket variant of the point quadtree: leaves keep up to bucket_size points in a list and only split once
+    # they overflow, so there is one node per bucket instead of one per point. Inner nodes hold a split point
+    # (not necessarily a stored point) and their sons, created when a point first falls in their quadrant.
+    # Every node counts the points below it, which lets deletes merge underfull subtrees back into one bucket.
+    # Subtrees merge at half a bucket rather than a full one, so a tree that alternates inserts and deletes
+    # around bucket_size does not split and merge the same bucket on every update.
+    _TOPLEFT = 0
+    _TOPRIGHT = 1
+    _BOTTOMRIGHT = 2
+    _BOTTOMLEFT = 3
+
+    def __init__(self, bucket_size: int = 8):
+        if bucket_size < 1:
+            raise ValueError('bucket_size must be positive')
+        self.bucket_size = bucket_size
+        self.points = []  # None once the node is split
+        self.split = None
+        self.sons = None
+        self.size = 0
+
+    @classmethod
+    def from_points(cls, points, bucket_size: int = 8) -> 'BucketQuadTree':
+        tree = cls(bucket_size)
+        tree.points = list(dict.fromkeys(quadtree_helpers.iter_points(points)))
+        tree.size = len(tree.points)
+        if tree.size > bucket_size:
+            tree._split()
+        return tree
+
+    def insert(self, p: Point):
+        path = []
+        node = self
+        while node.sons is not None:
+            path.append(node)
+            child_idx = ArrayQuadTree._direction(p.x, p.y, node.split.x, node.split.y)
+            if node.sons[child_idx] is None:
+                node.sons[child_idx] = type(self)(self.bucket_size)
+            node = node.sons[child_idx]
+        if p in node.points:
+            return
+        node.points.append(p)
+        for ancestor in path:
+            ancestor.size += 1
+        node.size += 1
+        if node.size > self.bucket_size:
+            node._split()
+
+    def search(self, p: Point):
+        node = self._find_leaf(p)
+        if node is None:
+            return None
+        for point in node.points:
+            if point == p:
+                return point
+        return None
+
+    def delete(self, p: Point):
+        path = []
+        node = self
+        while node is not None and node.sons is not None:
+            path.append(node)
+            node = node.sons[ArrayQuadTree._direction(p.x, p.y, node.split.x, node.split.y)]
+        if node is None or p not in node.points:
+            return
+        node.points.remove(p)
+        node.size -= 1
+        for ancestor in path:
+            ancestor.size -= 1
+        for ancestor in path:
+            if ancestor.size <= self.bucket_size // 2:
+                ancestor._merge()
+                return
+        if not node.size and path:
+            path[-1].sons[path[-1].sons.index(node)] = None
+
+    # Buckets need no reinsertion, so both QuadTree delete strategies are the same operation here.
+    delete_with_full_reinsertion = delete
+    delete_with_partial_reinsertion = delete
+
+    def range_query(self, xmin, ymin, xmax, ymax) -> List[Point]:
+        return list(self.iter_range_query(xmin, ymin, xmax, ymax))
+
+    def count_range_query(self, xmin, ymin, xmax, ymax) -> int:
+        return sum(1 for _ in self.iter_range_query(xmin, ymin, xmax, ymax))
+
+    def iter_range_query(self, xmin, ymin, xmax, ymax):
+        pending = [self]
+        while pending:
+            node = pending.pop()
+            if node.sons is None:
+                for point in node.points:
+                    if xmin <= point.x <= xmax and ymin <= point.y <= ymax:
+                        yield point
+                continue
+            x, y = node.split.x, node.split.y
+            sons = node.sons
+            for son_idx in quadtree_helpers.overlapped_quadrants(x, y, xmin, ymin, xmax, ymax):
+                if sons[son_idx] is not None:
+                    pending.append(sons[son_idx])
+
+    def get_all_points(self) -> List[Point]:
+        points = []
+        pending = [self]
+        while pending:
+            node = pending.pop()
+            if node.sons is None:
+                points += node.points
+            else:
+                pending += [son for son in node.sons if son is not None]
+        return points
+
+    def _find_leaf(self, p: Point):
+        node = self
+        while node is not None and node.sons is not None:
+            node = node.sons[ArrayQuadTree._direction(p.x, p.y, node.split.x, node.split.y)]
+        return node
+
+    def _split(self):
+        pending = [self]
+        while pending:
+            node = pending.pop()
+            node.split = self._median_split(node.points)
+            node.sons = [None, None, None, None]
+            for point in node.points:
+                child_idx = ArrayQuadTree._direction(point.x, point.y, node.split.x, node.split.y)
+                if node.sons[child_idx] is None:
+                    node.sons[child_idx] = type(self)(self.bucket_size)
+                node.sons[child_idx].points.append(point)
+            node.points = None
+            for son in node.sons:
+                if son is not None:
+                    son.size = len(son.points)
+                    if son.size > self.bucket_size:
+                        pending.append(son)
+
+    @staticmethod
+    def _median_split(points: List[Point]) -> Point:
+        # Medians of the distinct coordinates: as the points are distinct, one axis has at least two values and
+        # its median leaves points on both sides, so every split makes progress even on heavily tied clusters.
+        xs = sorted({point.x for point in points})
+        ys = sorted({point.y for point in points})
+        return Point(xs[len(xs) // 2], ys[len(ys) // 2])
+
+    def _merge(self):
+        self.points = self.get_all_points()
+        self.split = None
+        self.sons = None
@@ -0,0 +1,203 @@
+import math
+import time
+from collections import OrderedDict, namedtuple
+from typing import List
+
+from Point import Point
+from QuadTree import QuadTree
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'invalidations', 'maxsize', 'currsize'])
+
+
+class CachedQuadTree:
+    # Query cache in front of a QuadTree (or any of its subclasses) for skewed traffic that repeats the same
+    # boxes and nearest-neighbour lookups. Entries are evicted least recently used past maxsize and expire after
+    # ttl seconds when one is given. Every entry remembers the region its answer depends on, a box or a ball around
+    # the query point, and an update only drops the entries whose region covers the point it changed. To find them
+    # without scanning the whole cache, each entry is filed under the cells its region overlaps in a power-of-two
+    # grid whose cells are at least as wide as the region, so in at most four cells of one grid level. Regions
+    # without a bounded box (infinite radii or custom metrics) are kept apart and always checked.
+
+    def __init__(self, tree: QuadTree = None, maxsize: int = 1024, ttl: float = None):
+        self._tree = tree if tree is not None else QuadTree()
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (result, region, expiry)
+        self._grid = {}  # level -> {(column, row) -> keys of the entries filed in that cell}
+        self._unbounded = set()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def cache_info(self) -> CacheInfo:
+        return CacheInfo(self.hits, self.misses, self.invalidations, self.maxsize, len(self._entries))
+
+    def cache_clear(self):
+        self._entries.clear()
+        self._grid.clear()
+        self._unbounded.clear()
+
+    def search(self, p: Point):
+        return self._tree.search(p)
+
+    def range_query(self, xmin, ymin, xmax, ymax) -> List[Point]:
+        key = ('range', xmin, ymin, xmax, ymax)
+        result = self._lookup(key)
+        if result is None:
+            result = self._store(key, self._tree.range_query(xmin, ymin, xmax, ymax), ('box', xmin, ymin, xmax, ymax))
+        return list(result)
+
+    def count_range_query(self, xmin, ymin, xmax, ymax) -> int:
+        key = ('count', xmin, ymin, xmax, ymax)
+        result = self._lookup(key)
+        if result is None:
+            result = self._store(key, self._tree.count_range_query(xmin, ymin, xmax, ymax),
+                                 ('box', xmin, ymin, xmax, ymax))
+        return result
+
+    def nearest(self, p: Point, k: int = 1, metric='l2') -> List[Point]:
+        key = ('nearest', p, k, metric)
+        result = self._lookup(key)
+        if result is None:
+            result = self._tree.nearest(p, k, metric)
+            distance = self._distance(metric)
+            # Only points at most as far as the k-th neighbour can change the answer; with fewer than k points in
+            # the tree any new point does.
+            radius = distance(result[-1], p) if len(result) == k and k > 0 else math.inf
+            result = self._store(key, result, ('ball', p, radius, distance))
+        return list(result)
+
+    def within_radius(self, p: Point, r, metric='l2') -> List[Point]:
+        key = ('radius', p, r, metric)
+        result = self._lookup(key)
+        if result is None:
+            result = self._store(key, self._tree.within_radius(p, r, metric), ('ball', p, r, self._distance(metric)))
+        return list(result)
+
+    # The tree is only searched when some entry covers the point, to tell a real change from a no-op update.
+
+    def insert(self, p: Point):
+        stale = self._covering(p)
+        if stale and self._tree.search(p) is None:
+            self._drop(stale)
+        self._tree.insert(p)
+
+    def insert_quadtree(self, qt: QuadTree):
+        for node in [qt] + qt.get_all_child_points():
+            if node.point:
+                stale = self._covering(node.point)
+                if stale and self._tree.search(node.point) is None:
+                    self._drop(stale)
+        return self._tree.insert_quadtree(qt)
+
+    def delete_with_full_reinsertion(self, p: Point):
+        self._invalidate_stored(p)
+        self._tree.delete_with_full_reinsertion(p)
+
+    def delete_with_partial_reinsertion(self, p: Point):
+        self._invalidate_stored(p)
+        self._tree.delete_with_partial_reinsertion(p)
+
+    def delete_lazy(self, p: Point):
+        self._invalidate_stored(p)
+        self._tree.delete_lazy(p)
+
+    def compact(self):
+        # Compaction keeps the same live points, so every cached answer stays valid.
+        self._tree.compact()
+
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is not None and (entry[2] is None or entry[2] > time.monotonic()):
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+        if entry is not None:
+            self._remove(key)
+        self.misses += 1
+        return None
+
+    def _store(self, key, result, region):
+        if self.maxsize > 0:
+            expiry = time.monotonic() + self.ttl if self.ttl is not None else None
+            self._entries[key] = (result, region, expiry)
+            cells = self._cells(region)
+            if cells is None:
+                self._unbounded.add(key)
+            else:
+                level, cells = cells
+                grid = self._grid.setdefault(level, {})
+                for cell in cells:
+                    grid.setdefault(cell, set()).add(key)
+            if len(self._entries) > self.maxsize:
+                self._remove(next(iter(self._entries)))
+        return result
+
+    def _remove(self, key):
+        _, region, _ = self._entries.pop(key)
+        cells = self._cells(region)
+        if cells is None:
+            self._unbounded.discard(key)
+            return
+        level, cells = cells
+        grid = self._grid[level]
+        for cell in cells:
+            keys = grid[cell]
+            keys.discard(key)
+            if not keys:
+                del grid[cell]
+        if not grid:
+            del self._grid[level]
+
+    def _covering(self, p: Point):
+        candidates = set(self._unbounded)
+        for level, grid in self._grid.items():
+            column, row = math.ldexp(p.x, -level), math.ldexp(p.y, -level)
+            if math.isfinite(column) and math.isfinite(row):
+                candidates |= grid.get((math.floor(column), math.floor(row)), set())
+        return [key for key in candidates if self._covers(self._entries[key][1], p)]
+
+    def _drop(self, stale):
+        for key in stale:
+            self._remove(key)
+        self.invalidations += len(stale)
+
+    def _invalidate_stored(self, p: Point):
+        stale = self._covering(p)
+        if stale and self._tree.search(p) is not None:
+            self._drop(stale)
+
+    @staticmethod
+    def _cells(region):
+        # The grid level and the cells of the region's bounding box, None when it has none. Cells at level L are
+        # 2 ** L wide, with L the smallest level whose cells are wider than the box and not finer than the
+        # precision of its coordinates.
+        if region[0] == 'box':
+            _, xmin, ymin, xmax, ymax = region
+        elif region[3] in QuadTree._METRICS.values():
+            # The built-in distances are at least |dx| and |dy|; the margin absorbs their rounding.
+            _, center, radius, _ = region
+            margin = 4 * math.ulp(max(abs(center.x), abs(center.y)) + radius)
+            xmin, xmax = center.x - radius - margin, center.x + radius + margin
+            ymin, ymax = center.y - radius - margin, center.y + radius + margin
+        else:
+            return None
+        size = max(xmax - xmin, ymax - ymin)
+        if not math.isfinite(size):
+            return None
+        level = max(math.frexp(size)[1], math.frexp(max(abs(xmin), abs(xmax), abs(ymin), abs(ymax)))[1] - 52)
+        columns = range(math.floor(math.ldexp(xmin, -level)), math.floor(math.ldexp(xmax, -level)) + 1)
+        rows = range(math.floor(math.ldexp(ymin, -level)), math.floor(math.ldexp(ymax, -level)) + 1)
+        return level, [(column, row) for column in columns for row in rows]
+
+    @staticmethod
+    def _covers(region, p: Point) -> bool:
+        if region[0] == 'box':
+            _, xmin, ymin, xmax, ymax = region
+            return xmin <= p.x <= xmax and ymin <= p.y <= ymax
+        _, center, radius, distance = region
+        return distance(p, center) <= radius
+
+    @staticmethod
+    def _distance(metric):
+        return QuadTree._METRICS[metric] if isinstance(metric, str) else metric
@@ -0,0 +1,118 @@
+import threading
+from contextlib import contextmanager
+from typing import List
+
+from Point import Point
+from QuadTree import QuadTree
+
+
+class ReadWriteLock:
+    # Many readers or a single writer. Waiting writers stop new readers from entering, so a steady stream of
+    # queries cannot starve the updates. Not reentrant.
+
+    def __init__(self):
+        self._condition = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writing = False
+        self._waiting_writers = 0
+
+    def acquire_read(self):
+        with self._condition:
+            while self._writing or self._waiting_writers:
+                self._condition.wait()
+            self._readers += 1
+
+    def release_read(self):
+        with self._condition:
+            self._readers -= 1
+            if not self._readers:
+                self._condition.notify_all()
+
+    def acquire_write(self):
+        with self._condition:
+            self._waiting_writers += 1
+            while self._writing or self._readers:
+                self._condition.wait()
+            self._waiting_writers -= 1
+            self._writing = True
+
+    def release_write(self):
+        with self._condition:
+            self._writing = False
+            self._condition.notify_all()
+
+    @contextmanager
+    def read_locked(self):
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def write_locked(self):
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
+
+
+class ConcurrentQuadTree:
+    # Thread-safe front for a QuadTree (or any of its subclasses): queries share a read lock and updates take
+    # the write lock, so readers never see the intermediate states of a delete. Results are built under the lock
+    # and returned as points rather than nodes, which the next update may change.
+
+    def __init__(self, tree: QuadTree = None):
+        self._tree = tree if tree is not None else QuadTree()
+        self.lock = ReadWriteLock()
+
+    def insert(self, p: Point):
+        with self.lock.write_locked():
+            self._tree.insert(p)
+
+    def delete_with_full_reinsertion(self, p: Point):
+        with self.lock.write_locked():
+            self._tree.delete_with_full_reinsertion(p)
+
+    def delete_with_partial_reinsertion(self, p: Point):
+        with self.lock.write_locked():
+            self._tree.delete_with_partial_reinsertion(p)
+
+    def delete_lazy(self, p: Point):
+        with self.lock.write_locked():
+            self._tree.delete_lazy(p)
+
+    def compact(self):
+        with self.lock.write_locked():
+            self._tree.compact()
+
+    def search(self, p: Point):
+        with self.lock.read_locked():
+            node = self._tree.search(p)
+            return node.point if node is not None else None
+
+    def range_query(self, xmin, ymin, xmax, ymax) -> List[Point]:
+        with self.lock.read_locked():
+            return self._tree.range_query(xmin, ymin, xmax, ymax)
+
+    def count_range_query(self, xmin, ymin, xmax, ymax) -> int:
+        with self.lock.read_locked():
+            return self._tree.count_range_query(xmin, ymin, xmax, ymax)
+
+    def nearest(self, p: Point, k: int = 1, metric='l2') -> List[Point]:
+        with self.lock.read_locked():
+            return self._tree.nearest(p, k, metric)
+
+    def within_radius(self, p: Point, r, metric='l2') -> List[Point]:
+        with self.lock.read_locked():
+            return self._tree.within_radius(p, r, metric)
+
+    def snapshot(self) -> QuadTree:
+        # Private copy for long-running reads (iteration, serialization) that should not hold back the writers.
+        with self.lock.read_locked():
+            return self._tree.clone()
+
+    def __repr__(self):
+        with self.lock.read_locked():
+            return repr(self._tree)
@@ -0,0 +1,273 @@
+import time
+from contextlib import contextmanager
+
+from QuadTree import QuadTree
+
+
+class OperationStats:
+    # Counters of one public operation, or the running totals of every operation with the same name. max_depth is
+    # the longest root-to-node descent (insert, search, delete); scans (range queries, nearest) are not descents and
+    # only count the nodes they visit.
+
+    def __init__(self, name: str):
+        self.name = name
+        self.count = 0
+        self.nodes_visited = 0
+        self.reinserted = 0
+        self.max_depth = 0
+        self.total_ns = 0
+        self.phases_ns = {}
+
+    def add(self, other: 'OperationStats'):
+        self.count += other.count
+        self.nodes_visited += other.nodes_visited
+        self.reinserted += other.reinserted
+        self.max_depth = max(self.max_depth, other.max_depth)
+        self.total_ns += other.total_ns
+        for phase, elapsed in other.phases_ns.items():
+            self.phases_ns[phase] = self.phases_ns.get(phase, 0) + elapsed
+
+    def as_dict(self):
+        return {'name': self.name, 'count': self.count, 'nodes_visited': self.nodes_visited,
+                'reinserted': self.reinserted, 'max_depth': self.max_depth, 'total_ns': self.total_ns,
+                'phases_ns': dict(self.phases_ns)}
+
+    def __repr__(self):
+        return 'OperationStats(' + repr(self.as_dict()) + ')'
+
+
+class StatsRecorder:
+    # Collects the stats of the operations run on an instrumented tree. Nested calls (the search inside
+    # delete_lazy, the inserts that reinsert nodes during a delete) are folded into the outermost operation, and
+    # its time is split into exclusive phases. Callbacks receive the OperationStats of every finished operation.
+
+    def __init__(self, callbacks=()):
+        self.callbacks = list(callbacks)
+        self.totals = {}
+        self.last = None
+        self._current = None
+        self._phases = []  # [phase, start] stack, only the top one is running
+        self._depth = 0
+        self._classes = {}
+
+    def add_callback(self, callback):
+        self.callbacks.append(callback)
+
+    def reset(self):
+        self.totals = {}
+        self.last = None
+
+    @contextmanager
+    def operation(self, name: str):
+        if self._current is not None:
+            yield
+            return
+        self._current = stats = OperationStats(name)
+        stats.count = 1
+        start_time = time.perf_counter_ns()
+        self._phases = [['other', start_time]]
+        try:
+            yield
+        finally:
+            end_time = time.perf_counter_ns()
+            phase, phase_start = self._phases.pop()
+            stats.phases_ns[phase] = stats.phases_ns.get(phase, 0) + end_time - phase_start
+            stats.total_ns = end_time - start_time
+            self._current = None
+            self.last = stats
+            self.totals.setdefault(name, OperationStats(name)).add(stats)
+            for callback in self.callbacks:
+                callback(stats)
+
+    @contextmanager
+    def phase(self, name: str):
+        if self._current is None:
+            yield
+            return
+        now = time.perf_counter_ns()
+        self._pause(now)
+        self._phases.append([name, now])
+        try:
+            yield
+        finally:
+            now = time.perf_counter_ns()
+            self._pause(now)
+            self._phases.pop()
+            self._phases[-1][1] = now
+
+    def _pause(self, now: int):
+        phase, phase_start = self._phases[-1]
+        self._current.phases_ns[phase] = self._current.phases_ns.get(phase, 0) + now - phase_start
+
+    def start_descent(self):
+        self._depth = 0
+
+    def visit(self):
+        if self._current is not None:
+            self._current.nodes_visited += 1
+            self._depth += 1
+            if self._depth > self._current.max_depth:
+                self._current.max_depth = self._depth
+
+    def scan(self, steps, nearest: bool = False):
+        # Relays the steps of a QuadTree._walk generator and counts the nodes it visits: one per step, except for
+        # the points _walk_nearest reports besides the nodes it expands.
+        for step in steps:
+            if self._current is not None and (step is None or not nearest):
+                self._current.nodes_visited += 1
+            yield step
+
+    def reinsert(self):
+        if self._current is not None and self._current.name.startswith('delete'):
+            self._current.reinserted += 1
+
+    def instrumented_class(self, tree_class):
+        if tree_class not in self._classes:
+            self._classes[tree_class] = type('Instrumented' + tree_class.__name__, (_InstrumentedNode, tree_class),
+                                             {'_recorder': self, '_plain_class': tree_class})
+        return self._classes[tree_class]
+
+
+class _InstrumentedNode:
+    # Mixed in front of the tree class of every node while stats are enabled. Nodes go back to their plain class
+    # when they are disabled, so trees without stats run the original methods untouched.
+    _recorder = None
+    _plain_class = None
+
+    def insert(self, p):
+        with self._recorder.operation('insert'):
+            self._recorder.start_descent()
+            return super().insert(p)
+
+    def insert_quadtree(self, qt):
+        with self._recorder.operation('insert'):
+            self._recorder.reinsert()
+            self._recorder.start_descent()
+            reinserting = self._recorder._current.name.startswith('delete')
+            with self._recorder.phase('reinsert' if reinserting else 'descent'):
+                return super().insert_quadtree(qt)
+
+    def search(self, p):
+        with self._recorder.operation('search'):
+            self._recorder.start_descent()
+            with self._recorder.phase('descent'):
+                node = super().search(p)
+            if node is not None:
+                self._recorder.visit()  # the matching node, where no child is selected
+            return node
+
+    def delete_with_full_reinsertion(self, p):
+        with self._recorder.operation('delete_with_full_reinsertion'):
+            return super().delete_with_full_reinsertion(p)
+
+    def delete_with_partial_reinsertion(self, p):
+        with self._recorder.operation('delete_with_partial_reinsertion'):
+            return super().delete_with_partial_reinsertion(p)
+
+    def delete_lazy(self, p):
+        with self._recorder.operation('delete_lazy'):
+            return super().delete_lazy(p)
+
+    def compact(self):
+        with self._recorder.operation('compact'):
+            return super().compact()
+
+    def range_query(self, xmin, ymin, xmax, ymax):
+        with self._recorder.operation('range_query'):
+            return super().range_query(xmin, ymin, xmax, ymax)
+
+    def count_range_query(self, xmin, ymin, xmax, ymax):
+        with self._recorder.operation('count_range_query'):
+            return super().count_range_query(xmin, ymin, xmax, ymax)
+
+    def nearest(self, p, k=1, metric='l2'):
+        with self._recorder.operation('nearest'):
+            return super().nearest(p, k, metric)
+
+    def within_radius(self, p, r, metric='l2'):
+        with self._recorder.operation('within_radius'):
+            return super().within_radius(p, r, metric)
+
+    def _walk_points(self):
+        return self._recorder.scan(super()._walk_points())
+
+    def _walk_range_query(self, xmin, ymin, xmax, ymax):
+        return self._recorder.scan(super()._walk_range_query(xmin, ymin, xmax, ymax))
+
+    def _walk_nearest(self, p, metric):
+        return self._recorder.scan(super()._walk_nearest(p, metric), nearest=True)
+
+    def _find_with_run(self, p):
+        self._recorder.start_descent()
+        with self._recorder.phase('descent'):
+            run_top, parent, node, child_idx = super()._find_with_run(p)
+        if node is not None:
+            self._recorder.visit()
+        return run_top, parent, node, child_idx
+
+    def _select_child(self, p):
+        self._recorder.visit()
+        return super()._select_child(p)
+
+    def get_all_child_points(self):
+        with self._recorder.phase('collect'):
+            child_points = super().get_all_child_points()
+        if self._recorder._current is not None:
+            self._recorder._current.nodes_visited += 1 + len(child_points)
+        return child_points
+
+    def _candidate_spine(self, quadrant):
+        with self._recorder.phase('select_candidate'):
+            return super()._candidate_spine(quadrant)
+
+    def _select_node_to_change(self, p, candidate_nodes=None):
+        with self._recorder.phase('select_candidate'):
+            return super()._select_node_to_change(p, candidate_nodes)
+
+    def find_candidate(self, quadrant):
+        with self._recorder.phase('select_candidate'):
+            return super().find_candidate(quadrant)
+
+    def _collect_crosshatched(self, roots, point_to_be_deleted, selected_point):
+        with self._recorder.phase('adj'):
+            return super()._collect_crosshatched(roots, point_to_be_deleted, selected_point)
+
+    def _replace_deleted_node(self, selected_node, parent, child_idx):
+        with self._recorder.phase('replace'):
+            return super()._replace_deleted_node(selected_node, parent, child_idx)
+
+
+def enable_stats(qt: QuadTree, recorder: StatsRecorder = None) -> StatsRecorder:
+    recorder = recorder if recorder is not None else StatsRecorder()
+    for node in [qt] + qt.get_all_child_points():
+        plain_class = node._plain_class if isinstance(node, _InstrumentedNode) else type(node)
+        node.__class__ = recorder.instrumented_class(plain_class)
+    return recorder
+
+
+def disable_stats(qt: QuadTree):
+    for node in [qt] + qt.get_all_child_points():
+        if isinstance(node, _InstrumentedNode):
+            node.__class__ = node._plain_class
+
+
+def tree_shape(qt: QuadTree):
+    # Level by level: how many nodes each depth holds and, for every depth, how many of its nodes have 0 to 4
+    # sons (fan-out). Lazily deleted nodes are counted as nodes and also reported apart.
+    depth_histogram, fanout = [], []
+    nodes = deleted = 0
+    level = [qt] if qt.point else []
+    while level:
+        depth_histogram.append(len(level))
+        sons_per_node = [0] * 5
+        next_level = []
+        for node in level:
+            sons = [son for son in node.sons if son]
+            sons_per_node[len(sons)] += 1
+            deleted += node._deleted
+            next_level += sons
+        fanout.append(sons_per_node)
+        nodes += len(level)
+        level = next_level
+    return {'nodes': nodes, 'deleted': deleted, 'depth': len(depth_histogram), 'depth_histogram': depth_histogram,
+            'fanout': fanout}
@@ -0,0 +1,118 @@
+import mmap
+import struct
+import sys
+from array import array
+from typing import List
+
+import ArrayQuadTree as array_quadtree
+from Point import Point
+
+# File layout, little-endian: magic, version, node count, then xs (float64 * n), ys (float64 * n) and the
+# sons of every node (int32 * 4n, preorder indices, -1 when missing). Node 0 is the root.
+_MAGIC = b'QTREE'
+_VERSION = 1
+_HEADER = struct.Struct('<5sBxxQ')
+
+
+def write_preorder(qt, path: str):
+    qt = qt._live_tree()
+    xs, ys, sons = array('d'), array('d'), array('i')
+    if qt.point:
+        pending = [(qt, -1)]
+        while pending:
+            node, slot = pending.pop()
+            idx = len(xs)
+            if slot >= 0:
+                sons[slot] = idx
+            xs.append(node.point.x)
+            ys.append(node.point.y)
+            sons.extend((-1, -1, -1, -1))
+            for son_idx in range(3, -1, -1):
+                if node.sons[son_idx]:
+                    pending.append((node.sons[son_idx], 4 * idx + son_idx))
+    if sys.byteorder != 'little':
+        for buffer in (xs, ys, sons):
+            buffer.byteswap()
+    with open(path, 'wb') as f:
+        f.write(_HEADER.pack(_MAGIC, _VERSION, len(xs)))
+        xs.tofile(f)
+        ys.tofile(f)
+        sons.tofile(f)
+
+
+def read_preorder(path: str):
+    with open(path, 'rb') as f:
+        count = _read_header(f.read(_HEADER.size))
+        xs, ys, sons = array('d'), array('d'), array('i')
+        xs.fromfile(f, count)
+        ys.fromfile(f, count)
+        sons.fromfile(f, 4 * count)
+    if sys.byteorder != 'little':
+        for buffer in (xs, ys, sons):
+            buffer.byteswap()
+    return xs, ys, sons
+
+
+def _read_header(header: bytes) -> int:
+    if len(header) < _HEADER.size:
+        raise ValueError('Not a QuadTree file: truncated header')
+    magic, version, count = _HEADER.unpack(header)
+    if magic != _MAGIC:
+        raise ValueError('Not a QuadTree file: bad magic ' + repr(magic))
+    if version != _VERSION:
+        raise ValueError('Unsupported QuadTree file version ' + str(version))
+    return count
+
+
+class MappedQuadTree:
+    # Read-only view of a saved tree: queries run directly on the memory-mapped node buffers, so loading is
+    # O(1) and only the pages touched by queries are read from disk.
+
+    def __init__(self, path: str):
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        count = _read_header(self._mmap[:_HEADER.size])
+        self._count = count
+        offset = _HEADER.size
+        view = memoryview(self._mmap)
+        if sys.byteorder == 'little':
+            self._xs = view[offset: offset + 8 * count].cast('d')
+            self._ys = view[offset + 8 * count: offset + 16 * count].cast('d')
+            self._sons = view[offset + 16 * count: offset + 32 * count].cast('i')
+        else:
+            self._xs, self._ys, self._sons = read_preorder(path)
+        view.release()
+        self._root = 0 if count else -1
+
+    def __len__(self):
+        return self._count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        for buffer in (self._xs, self._ys, self._sons):
+            if isinstance(buffer, memoryview):
+                buffer.release()
+        self._mmap.close()
+
+    def search(self, p: Point):
+        node = array_quadtree.search_node(self._xs, self._ys, self._sons, self._root, p.x, p.y)
+        if node == -1:
+            return None
+        return Point(self._xs[node], self._ys[node])
+
+    def range_query(self, xmin, ymin, xmax, ymax) -> List[Point]:
+        return list(self.iter_range_query(xmin, ymin, xmax, ymax))
+
+    def count_range_query(self, xmin, ymin, xmax, ymax) -> int:
+        return sum(1 for _ in array_quadtree.iter_range_query(self._xs, self._ys, self._sons, self._root,
+                                                              xmin, ymin, xmax, ymax))
+
+    def iter_range_query(self, xmin, ymin, xmax, ymax):
+        for node in array_quadtree.iter_range_query(self._xs, self._ys, self._sons, self._root,
+                                                    xmin, ymin, xmax, ymax):
+            yield Point(self._xs[node], self._ys[node])
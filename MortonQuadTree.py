@@ -0,0 +1,186 @@
+import heapq
+import itertools
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import List
+
+from Point import Point
+from QuadTree import QuadTree
+
+
+def _spread_bits(n: int) -> int:
+    # Inserts a zero bit between each of the lower 32 bits of n.
+    n &= 0xffffffff
+    n = (n | (n << 16)) & 0x0000ffff0000ffff
+    n = (n | (n << 8)) & 0x00ff00ff00ff00ff
+    n = (n | (n << 4)) & 0x0f0f0f0f0f0f0f0f
+    n = (n | (n << 2)) & 0x3333333333333333
+    n = (n | (n << 1)) & 0x5555555555555555
+    return n
+
+
+def morton_code(qx: int, qy: int) -> int:
+    return _spread_bits(qx) | (_spread_bits(qy) << 1)
+
+
+class MortonQuadTree:
+    # Read-only linear quadtree: the points are quantized to a 2^bits x 2^bits grid over their bounding box and
+    # kept sorted by the Morton (Z-order) code of their cell in contiguous arrays. Every quadtree cell is then a
+    # contiguous run of codes, so queries are binary searches over the codes followed by sequential scans.
+    # Only coordinates are stored, like in ArrayQuadTree.
+    max_intervals = 64  # range queries stop refining partially covered cells past this many code intervals
+    leaf_size = 16  # k-NN scans cells holding this many points instead of splitting them further
+
+    def __init__(self, bits: int = 20):
+        if not 1 <= bits <= 32:
+            raise ValueError('bits must be between 1 and 32')
+        self._bits = bits
+        self._codes = array('Q')
+        self._xs = array('d')
+        self._ys = array('d')
+        self._bounds = None
+        self._scale = (0., 0.)
+
+    @classmethod
+    def from_points(cls, points, bits: int = 20) -> 'MortonQuadTree':
+        mqt = cls(bits)
+        unique = list(dict.fromkeys((p.x, p.y) if isinstance(p, Point) else (p[0], p[1]) for p in points))
+        if not unique:
+            return mqt
+        xmin, xmax = min(x for x, _ in unique), max(x for x, _ in unique)
+        ymin, ymax = min(y for _, y in unique), max(y for _, y in unique)
+        mqt._bounds = (xmin, ymin, xmax, ymax)
+        cells = (1 << bits) - 1
+        mqt._scale = (cells / (xmax - xmin) if xmax > xmin else 0., cells / (ymax - ymin) if ymax > ymin else 0.)
+        entries = sorted((morton_code(*mqt._quantize(x, y)), x, y) for x, y in unique)
+        mqt._codes = array('Q', (code for code, _, _ in entries))
+        mqt._xs = array('d', (x for _, x, _ in entries))
+        mqt._ys = array('d', (y for _, _, y in entries))
+        return mqt
+
+    def __len__(self):
+        return len(self._codes)
+
+    def _quantize(self, x, y):
+        # Monotonic in both coordinates, so a box always maps onto the cells of the points inside it.
+        xmin, ymin, _, _ = self._bounds
+        top = (1 << self._bits) - 1
+        qx = min(max(int((x - xmin) * self._scale[0]), 0), top)
+        qy = min(max(int((y - ymin) * self._scale[1]), 0), top)
+        return qx, qy
+
+    def _cell_region(self, cx: int, cy: int, shift: int):
+        # Widened by half a grid cell on each side so that rounding in _quantize never puts a point outside it.
+        xmin, ymin, xmax, ymax = self._bounds
+        sx, sy = self._scale
+        size = 1 << shift
+        return (xmin + (cx * size - .5) / sx if sx else xmin, ymin + (cy * size - .5) / sy if sy else ymin,
+                xmin + ((cx + 1) * size + .5) / sx if sx else xmax, ymin + ((cy + 1) * size + .5) / sy if sy else ymax)
+
+    def search(self, p: Point):
+        if not self._codes:
+            return None
+        code = morton_code(*self._quantize(p.x, p.y))
+        idx = bisect_left(self._codes, code)
+        while idx < len(self._codes) and self._codes[idx] == code:
+            if self._xs[idx] == p.x and self._ys[idx] == p.y:
+                return Point(p.x, p.y)
+            idx += 1
+        return None
+
+    def range_query(self, xmin, ymin, xmax, ymax) -> List[Point]:
+        return list(self.iter_range_query(xmin, ymin, xmax, ymax))
+
+    def count_range_query(self, xmin, ymin, xmax, ymax) -> int:
+        return sum(1 for _ in self._iter_range_indices(xmin, ymin, xmax, ymax))
+
+    def iter_range_query(self, xmin, ymin, xmax, ymax):
+        for idx in self._iter_range_indices(xmin, ymin, xmax, ymax):
+            yield Point(self._xs[idx], self._ys[idx])
+
+    def _iter_range_indices(self, xmin, ymin, xmax, ymax):
+        if not self._codes or xmin > xmax or ymin > ymax:
+            return
+        bxmin, bymin, bxmax, bymax = self._bounds
+        if xmax < bxmin or xmin > bxmax or ymax < bymin or ymin > bymax:
+            return
+        qx0, qy0 = self._quantize(xmin, ymin)
+        qx1, qy1 = self._quantize(xmax, ymax)
+        xs, ys, codes = self._xs, self._ys, self._codes
+        for start, end in self._code_intervals(qx0, qy0, qx1, qy1):
+            idx = bisect_left(codes, start)
+            stop = bisect_right(codes, end, idx)
+            for idx in range(idx, stop):
+                if xmin <= xs[idx] <= xmax and ymin <= ys[idx] <= ymax:
+                    yield idx
+
+    def _code_intervals(self, qx0, qy0, qx1, qy1):
+        # Cells of the implicit quadtree are refined level by level: cells inside the query become one code
+        # interval each, partially covered ones are split until there would be more than max_intervals of them,
+        # and the remaining ones are scanned whole and filtered on the coordinates.
+        intervals = []
+        cells = [(0, 0, self._bits)]
+        while cells:
+            partial = []
+            for cx, cy, shift in cells:
+                x0, y0 = cx << shift, cy << shift
+                x1, y1 = x0 + (1 << shift) - 1, y0 + (1 << shift) - 1
+                if x1 < qx0 or x0 > qx1 or y1 < qy0 or y0 > qy1:
+                    continue
+                if (qx0 <= x0 and x1 <= qx1 and qy0 <= y0 and y1 <= qy1) or not shift:
+                    intervals.append(self._cell_interval(cx, cy, shift))
+                else:
+                    partial.append((cx, cy, shift))
+            if len(intervals) + 4 * len(partial) > self.max_intervals:
+                intervals += [self._cell_interval(cx, cy, shift) for cx, cy, shift in partial]
+                break
+            cells = [(2 * cx + dx, 2 * cy + dy, shift - 1)
+                     for cx, cy, shift in partial for dx in (0, 1) for dy in (0, 1)]
+        intervals.sort()
+        merged = []
+        for start, end in intervals:
+            if merged and start <= merged[-1][1] + 1:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+            else:
+                merged.append((start, end))
+        return merged
+
+    @staticmethod
+    def _cell_interval(cx: int, cy: int, shift: int):
+        start = morton_code(cx << shift, cy << shift)
+        return start, start + (1 << (2 * shift)) - 1
+
+    def nearest(self, p: Point, k: int = 1, metric='l2') -> List[Point]:
+        return [point for _, point in itertools.islice(self._iter_nearest(p, metric), k)]
+
+    def within_radius(self, p: Point, r, metric='l2') -> List[Point]:
+        return [point for _, point in itertools.takewhile(lambda dp: dp[0] <= r, self._iter_nearest(p, metric))]
+
+    def _iter_nearest(self, p: Point, metric):
+        # Best-first over the implicit quadtree cells as in QuadTree._iter_nearest; a cell's points are the run of
+        # codes in its interval, so small or finest cells are expanded into their points directly.
+        if not self._codes:
+            return
+        distance = QuadTree._METRICS[metric] if isinstance(metric, str) else metric
+        tie_breaker = itertools.count()
+        heap = [(0., next(tie_breaker), (0, 0, self._bits), None)]
+        while heap:
+            dist, _, item, points = heapq.heappop(heap)
+            if points is not None:
+                yield dist, item
+                continue
+            cx, cy, shift = item
+            start, end = self._cell_interval(cx, cy, shift)
+            lo = bisect_left(self._codes, start)
+            hi = bisect_right(self._codes, end, lo)
+            if hi - lo <= self.leaf_size or not shift:
+                for idx in range(lo, hi):
+                    point = Point(self._xs[idx], self._ys[idx])
+                    heapq.heappush(heap, (distance(point, p), next(tie_breaker), point, True))
+            elif hi > lo:
+                for dx in (0, 1):
+                    for dy in (0, 1):
+                        son = (2 * cx + dx, 2 * cy + dy, shift - 1)
+                        region = self._cell_region(*son)
+                        heapq.heappush(heap, (QuadTree._region_distance(p, region, distance), next(tie_breaker),
+                                              son, None))
@@ -0,0 +1,101 @@
+from typing import List
+
+import QuadTreeHelpers as quadtree_helpers
+from Point import Point
+from QuadTree import QuadTree
+
+
+class MultisetQuadTree(QuadTree):
+    # Multiset of points: inserting a coordinate that is already stored appends the new payload to the payloads of
+    # its node instead of dropping it. A delete removes one payload, the one equal to the deleted point's payload
+    # (any one when it is None), and only restructures the tree when the node loses its last payload. node.point
+    # carries the first payload of its node.
+
+    def __init__(self, point: Point = None):
+        super().__init__(point)
+        self.payloads = [point.payload] if point else []
+
+    @classmethod
+    def _bulk_load(cls, points, build) -> 'MultisetQuadTree':
+        payloads = {}
+        for p in quadtree_helpers.iter_points(points):
+            payloads.setdefault(p, []).append(p.payload)
+        tree = super()._bulk_load(list(payloads), build)
+        if tree.point:
+            for node in [tree] + tree.get_all_child_points():
+                node.payloads = payloads[node.point]
+        return tree
+
+    def _insert_stored(self, node: 'MultisetQuadTree', qt: 'MultisetQuadTree'):
+        if not node._deleted:
+            node.payloads += qt.payloads
+            return
+        super()._insert_stored(node, qt)
+        node.payloads = qt.payloads
+
+    def _adopt(self, qt: 'MultisetQuadTree'):
+        super()._adopt(qt)
+        self.payloads = qt.payloads
+
+    def _copy_node(self, share_points: bool) -> 'MultisetQuadTree':
+        node = super()._copy_node(share_points)
+        node.payloads = list(self.payloads)
+        return node
+
+    def count(self, p: Point) -> int:
+        node = self.search(p)
+        return len(node.payloads) if node is not None else 0
+
+    def payloads_at(self, p: Point) -> list:
+        node = self.search(p)
+        return list(node.payloads) if node is not None else []
+
+    def range_query_records(self, xmin, ymin, xmax, ymax) -> List[Point]:
+        # One point per stored payload, where range_query returns one per coordinate.
+        nodes = [node for node in self._walk_range_query(xmin, ymin, xmax, ymax) if node is not None]
+        return [Point(node.point.x, node.point.y, payload) for node in nodes for payload in node.payloads]
+
+    def delete_with_full_reinsertion(self, p: Point):
+        if not self._remove_payload(p):
+            super().delete_with_full_reinsertion(p)
+
+    def delete_with_partial_reinsertion(self, p: Point):
+        if not self._remove_payload(p):
+            super().delete_with_partial_reinsertion(p)
+
+    def delete_lazy(self, p: Point):
+        if not self._remove_payload(p):
+            super().delete_lazy(p)
+
+    def _remove_payload(self, p: Point) -> bool:
+        # True when the delete is over without touching the tree: another payload remains at the coordinate, or
+        # the requested payload is not there. False lets the tree remove the node.
+        node = self.search(p)
+        if node is None:
+            return False
+        if p.payload in node.payloads:
+            idx = node.payloads.index(p.payload)
+        elif p.payload is None:
+            idx = len(node.payloads) - 1
+        else:
+            return True
+        if len(node.payloads) == 1:
+            return False
+        del node.payloads[idx]
+        if idx == 0:
+            node.point = Point(node.point.x, node.point.y, node.payloads[0])
+        return True
+
+    def _replace_deleted_node(self, selected_node: 'MultisetQuadTree', parent: 'MultisetQuadTree', child_idx: int):
+        # The selected node is emptied while it is removed from its subtree, so its payloads are kept aside.
+        payloads = selected_node.payloads
+        super()._replace_deleted_node(selected_node, parent, child_idx)
+        self.payloads = payloads
+
+    def compact(self):
+        live_nodes = [node for node in [self] + self.get_all_child_points() if node.point and not node._deleted]
+        records = [Point(node.point.x, node.point.y, payload) for node in live_nodes for payload in node.payloads]
+        if self.point:
+            self._adopt(type(self).from_points(records))
+        self._deleted_count = 0
+        self._known_size = len(live_nodes)
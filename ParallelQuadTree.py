@@ -0,0 +1,178 @@
+import functools
+import itertools
+import os
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import List
+
+import ArrayQuadTree as array_quadtree
+import QuadTreeHelpers as quadtree_helpers
+from ArrayQuadTree import ArrayQuadTree
+from Point import Point
+from QuadTree import QuadTree
+
+_shared_tree = None
+
+
+def parallel_from_points(points, workers: int = None, tree_class=QuadTree):
+    # Builds the same tree as tree_class.from_points: the top levels are split in this process until there are
+    # enough independent quadrants, which are then laid out by the worker pool. QuadTree classes are built through
+    # their _bulk_load, so subclasses keep what they store besides the points (payload lists, node counts); classes
+    # that override from_points instead, and classes other than QuadTree and ArrayQuadTree ones, are rejected.
+    # Node objects cannot be shared between processes, so for QuadTree classes the workers only compute the subtree shapes while sorting the
+    # points and creating the nodes stay in this process: about 0.8 s of the 1.9 s build of 200k points, which
+    # caps the speedup near 2x whatever the number of workers. For ArrayQuadTree classes the workers write their
+    # subtrees straight into shared buffers and this process only sorts the coordinates and splits the top levels,
+    # so the serial part is mostly the sort.
+    workers = workers or os.cpu_count()
+    if issubclass(tree_class, ArrayQuadTree):
+        return _parallel_array_tree(points, workers, tree_class)
+    if not issubclass(tree_class, QuadTree) or tree_class.from_points.__func__ is not QuadTree.from_points.__func__:
+        raise TypeError('parallel_from_points cannot build ' + tree_class.__name__ + ' like its from_points does')
+    return tree_class._bulk_load(points, functools.partial(_parallel_build, workers=workers, tree_class=tree_class))
+
+
+def _parallel_build(unique: List[Point], workers: int, tree_class) -> QuadTree:
+    min_task_size = max(1, len(unique) // (4 * workers))
+    if len(unique) <= min_task_size:
+        return tree_class._build_balanced(unique)
+    xs, ys = _coordinates(unique)
+    splits, tasks = _split_top_levels(xs, ys, min_task_size)
+    split_nodes = [tree_class(unique[split]) for split, _, _ in splits]
+    for node, (_, parent, child_idx) in zip(split_nodes[1:], splits[1:]):
+        split_nodes[parent].sons[child_idx] = node
+    chunks = [[unique[idx] for idx in indices] for indices, _, _ in tasks]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # Only coordinates travel to the workers and only the subtree shapes come back: unpickling whole node
+        # graphs in this process would cost more than building them.
+        shapes = executor.map(_build_subtree_shape, [_coordinates(chunk) for chunk in chunks],
+                              chunksize=max(1, len(tasks) // (4 * workers)))
+        for chunk, (_, parent, child_idx), shape in zip(chunks, tasks, shapes):
+            split_nodes[parent].sons[child_idx] = tree_class._from_shape(chunk, shape)
+    for node in reversed(split_nodes):
+        node._refresh_node()
+    return split_nodes[0]
+
+
+def _parallel_array_tree(points, workers: int, tree_class) -> ArrayQuadTree:
+    # The split nodes take the first slots of the buffers and every task the next run of slots, filled by
+    # its worker in the preorder of its subtree.
+    xs, ys = quadtree_helpers.sorted_coordinates(points)
+    min_task_size = max(1, len(xs) // (4 * workers))
+    if len(xs) <= min_task_size:
+        return tree_class.from_points(points)
+    splits, tasks = _split_top_levels(xs, ys, min_task_size)
+    offsets = list(itertools.accumulate((len(indices) for indices, _, _ in tasks), initial=len(splits)))
+    buffers = (array('d', bytes(8 * len(xs))), array('d', bytes(8 * len(xs))),
+               array('i', [array_quadtree._NO_NODE]) * (4 * len(xs)))
+    blocks = [_to_shared_memory(buffer) for buffer in buffers]
+    try:
+        layout = [(block.name, buffer.typecode, len(buffer)) for block, buffer in zip(blocks, buffers)]
+        with ProcessPoolExecutor(max_workers=workers, initializer=_attach_shared_tree,
+                                 initargs=(layout, array_quadtree._NO_NODE)) as executor:
+            work = [(offset, _subset(xs, ys, indices)) for offset, (indices, _, _) in zip(offsets, tasks)]
+            list(executor.map(_build_subtree_shared, work, chunksize=max(1, len(tasks) // (4 * workers))))
+        for block, buffer in zip(blocks, buffers):
+            data = memoryview(buffer).cast('B')
+            data[:] = block.buf[:data.nbytes]
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+    aqt = tree_class()
+    aqt._xs, aqt._ys, aqt._sons = buffers
+    for node, (split, parent, child_idx) in enumerate(splits):
+        aqt._xs[node], aqt._ys[node] = xs[split], ys[split]
+        if parent is not None:
+            aqt._sons[4 * parent + child_idx] = node
+    for offset, (_, parent, child_idx) in zip(offsets, tasks):
+        aqt._sons[4 * parent + child_idx] = offset
+    aqt._root = 0
+    aqt._count = len(xs)
+    return aqt
+
+
+def _split_top_levels(xs, ys, min_task_size: int):
+    # Splits the sorted, unique coordinates as balanced_shape does until every quadrant left holds at most
+    # min_task_size points. Returns the split indices, parents first, and the quadrants' indices, each with the
+    # position of its parent in the splits and the quadrant of the parent it fills.
+    splits, tasks = [], []
+    pending = [(array('i', range(len(xs))), None, None)]
+    while pending:
+        indices, parent, child_idx = pending.pop()
+        if len(indices) <= min_task_size:
+            tasks.append((indices, parent, child_idx))
+            continue
+        split = quadtree_helpers.balanced_split(xs, ys, indices)
+        splits.append((split, parent, child_idx))
+        quadrants = quadtree_helpers.partition(xs, ys, indices, split)
+        pending += [(quadrant, len(splits) - 1, idx) for idx, quadrant in enumerate(quadrants) if quadrant]
+    return splits, tasks
+
+
+def _coordinates(chunk: List[Point]):
+    return array('d', (pt.x for pt in chunk)), array('d', (pt.y for pt in chunk))
+
+
+def _subset(xs, ys, indices):
+    return array('d', (xs[idx] for idx in indices)), array('d', (ys[idx] for idx in indices))
+
+
+def _build_subtree_shape(coordinates):
+    return quadtree_helpers.balanced_shape(*coordinates)
+
+
+def _build_subtree_shared(task):
+    offset, (chunk_xs, chunk_ys) = task
+    _, (xs, ys, sons), _ = _shared_tree
+    order, masks = quadtree_helpers.balanced_shape(chunk_xs, chunk_ys)
+    for node, idx in enumerate(order, offset):
+        xs[node], ys[node] = chunk_xs[idx], chunk_ys[idx]
+    for node, (parent, child_idx) in enumerate(quadtree_helpers.iter_shape_links(masks), offset + 1):
+        sons[4 * (offset + parent) + child_idx] = node
+
+
+def parallel_range_query_many(tree, boxes, workers: int = None) -> List[List[Point]]:
+    # The tree is laid out as an ArrayQuadTree whose buffers are copied once into shared memory; workers attach
+    # to them and answer a share of the boxes without receiving a pickled copy of the tree.
+    workers = workers or os.cpu_count()
+    aqt = tree if isinstance(tree, ArrayQuadTree) else ArrayQuadTree.from_quadtree(tree)
+    boxes = [tuple(box) for box in boxes]
+    if len(aqt) == 0:
+        return [[] for _ in boxes]
+    blocks = [_to_shared_memory(buffer) for buffer in (aqt._xs, aqt._ys, aqt._sons)]
+    try:
+        layout = [(block.name, buffer.typecode, len(buffer))
+                  for block, buffer in zip(blocks, (aqt._xs, aqt._ys, aqt._sons))]
+        with ProcessPoolExecutor(max_workers=workers, initializer=_attach_shared_tree,
+                                 initargs=(layout, aqt._root)) as executor:
+            chunk_size = max(1, len(boxes) // (4 * workers))
+            node_lists = list(executor.map(_range_query_shared, boxes, chunksize=chunk_size))
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+    return [[Point(aqt._xs[node], aqt._ys[node]) for node in nodes] for nodes in node_lists]
+
+
+def _to_shared_memory(buffer) -> shared_memory.SharedMemory:
+    data = memoryview(buffer).cast('B')
+    block = shared_memory.SharedMemory(create=True, size=max(1, data.nbytes))
+    block.buf[:data.nbytes] = data
+    return block
+
+
+def _attach_shared_tree(layout, root: int):
+    global _shared_tree
+    blocks, views = [], []
+    for name, typecode, length in layout:
+        block = shared_memory.SharedMemory(name=name)
+        blocks.append(block)
+        views.append(block.buf.cast(typecode)[:length])
+    _shared_tree = (blocks, views, root)
+
+
+def _range_query_shared(box) -> List[int]:
+    _, (xs, ys, sons), root = _shared_tree
+    return list(array_quadtree.iter_range_query(xs, ys, sons, root, *box))
@@ -0,0 +1,129 @@
+from typing import List
+
+import QuadTreeHelpers as quadtree_helpers
+from ArrayQuadTree import ArrayQuadTree
+from Point import Point
+
+
+class PersistentQuadTree:
+    # Immutable point quadtree: insert and delete return the root of a new version and leave the old one intact.
+    # Only the nodes on the path to the change are copied, every other subtree is shared between versions, so
+    # keeping a version costs O(depth) instead of a full copy.
+    __slots__ = ('point', 'sons')
+
+    _TOPLEFT = 0
+    _TOPRIGHT = 1
+    _BOTTOMRIGHT = 2
+    _BOTTOMLEFT = 3
+
+    def __init__(self, point: Point = None, sons=(None, None, None, None)):
+        object.__setattr__(self, 'point', point)
+        object.__setattr__(self, 'sons', tuple(sons))
+
+    def __setattr__(self, name, value):
+        raise AttributeError('PersistentQuadTree is immutable')
+
+    def __delattr__(self, name):
+        raise AttributeError('PersistentQuadTree is immutable')
+
+    @classmethod
+    def from_points(cls, points) -> 'PersistentQuadTree':
+        unique = quadtree_helpers.sorted_unique_points(points)
+        if not unique:
+            return cls()
+        return cls._build_balanced(unique)
+
+    @classmethod
+    def _build_balanced(cls, ordered: List[Point]) -> 'PersistentQuadTree':
+        # Same shape as QuadTree._build_balanced, but sons have to exist before their parent, so the nodes are
+        # created in reverse preorder.
+        order, masks = quadtree_helpers.balanced_shape([pt.x for pt in ordered], [pt.y for pt in ordered])
+        sons = [[None, None, None, None] for _ in order]
+        links = list(quadtree_helpers.iter_shape_links(masks))
+        nodes = [None] * len(order)
+        for position in reversed(range(len(order))):
+            nodes[position] = cls(ordered[order[position]], sons[position])
+            if position:
+                parent, child_idx = links[position - 1]
+                sons[parent][child_idx] = nodes[position]
+        return nodes[0]
+
+    def insert(self, p: Point) -> 'PersistentQuadTree':
+        if not self.point:
+            return type(self)(p)
+        path = []
+        node = self
+        while node is not None:
+            if node.point == p:
+                return self
+            child_idx = ArrayQuadTree._direction(p.x, p.y, node.point.x, node.point.y)
+            path.append((node, child_idx))
+            node = node.sons[child_idx]
+        return self._copy_path(path, type(self)(p))
+
+    def delete(self, p: Point) -> 'PersistentQuadTree':
+        # A leaf is dropped and a node with a single son is replaced by that son: its points all lie in one
+        # quadrant of the deleted point, so they stay on the same side of every ancestor. Both only copy the path,
+        # O(depth). A node with more sons has its subtree rebuilt from the remaining points with the median split,
+        # which costs O(subtree size): O(depth) on average over the nodes of a balanced tree, but O(n) for the root.
+        path = []
+        node = self if self.point else None
+        while node is not None and node.point != p:
+            child_idx = ArrayQuadTree._direction(p.x, p.y, node.point.x, node.point.y)
+            path.append((node, child_idx))
+            node = node.sons[child_idx]
+        if node is None:
+            return self
+        sons = [son for son in node.sons if son is not None]
+        if len(sons) > 1:
+            replacement = type(self).from_points(node.get_all_points()[1:])
+        else:
+            replacement = sons[0] if sons else None
+        if not path:
+            return replacement if replacement is not None else type(self)()
+        return self._copy_path(path, replacement)
+
+    @staticmethod
+    def _copy_path(path, subtree: 'PersistentQuadTree') -> 'PersistentQuadTree':
+        for node, child_idx in reversed(path):
+            sons = list(node.sons)
+            sons[child_idx] = subtree
+            subtree = type(node)(node.point, sons)
+        return subtree
+
+    def search(self, p: Point):
+        node = self if self.point else None
+        while node is not None and node.point != p:
+            node = node.sons[ArrayQuadTree._direction(p.x, p.y, node.point.x, node.point.y)]
+        return node
+
+    def range_query(self, xmin, ymin, xmax, ymax) -> List[Point]:
+        return list(self.iter_range_query(xmin, ymin, xmax, ymax))
+
+    def count_range_query(self, xmin, ymin, xmax, ymax) -> int:
+        return sum(1 for _ in self.iter_range_query(xmin, ymin, xmax, ymax))
+
+    def iter_range_query(self, xmin, ymin, xmax, ymax):
+        pending = [self] if self.point else []
+        while pending:
+            node = pending.pop()
+            x, y = node.point.x, node.point.y
+            if xmin <= x <= xmax and ymin <= y <= ymax:
+                yield node.point
+            sons = node.sons
+            for son_idx in quadtree_helpers.overlapped_quadrants(x, y, xmin, ymin, xmax, ymax):
+                if sons[son_idx] is not None:
+                    pending.append(sons[son_idx])
+
+    def get_all_points(self) -> List[Point]:
+        # Preorder, starting with this node's point.
+        points = []
+        pending = [self] if self.point else []
+        while pending:
+            node = pending.pop()
+            points.append(node.point)
+            pending += [son for son in reversed(node.sons) if son is not None]
+        return points
+
+    def __repr__(self):
+        return quadtree_helpers.repr_tree(self, lambda node: node.point, lambda node: node.sons)
@@ -1,13 +1,46 @@
+import copy
+
+
 class Point:
+    # Immutable value: equality and hashing only look at the coordinates, the payload just rides along.
+    __slots__ = ('x', 'y', 'payload')
+
+    def __init__(self, x, y, payload=None):
+        _set_x(self, x)
+        _set_y(self, y)
+        _set_payload(self, payload)
 
-    def __init__(self, x, y):
-        self.x = x
-        self.y = y
+    def __setattr__(self, name, value):
+        raise AttributeError('Point is immutable')
+
+    def __delattr__(self, name):
+        raise AttributeError('Point is immutable')
 
     def __repr__(self):
         return '[' + str(self.x) + ', ' + str(self.y) + ']'
 
     def __eq__(self, other):
-        if isinstance(other, self.__class__):
+        if other.__class__ is self.__class__ or isinstance(other, self.__class__):
             return self.x == other.x and self.y == other.y
         return False
+
+    def __hash__(self):
+        return hash((self.x, self.y))
+
+    def __reduce__(self):
+        return self.__class__, (self.x, self.y, self.payload)
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        # Only the payload can be mutable: a point keeps being shared when deep copying its payload changes nothing.
+        payload = copy.deepcopy(self.payload, memo)
+        return self if payload is self.payload else self.__class__(self.x, self.y, payload)
+
+
+# Points are created on hot paths (bulk builds, every result of the array-backed engines), so __init__ writes the
+# slots through their descriptors directly instead of looking up object.__setattr__ three times.
+_set_x = Point.x.__set__
+_set_y = Point.y.__set__
+_set_payload = Point.payload.__set__
@@ -0,0 +1,123 @@
+import csv
+import itertools
+import sys
+import time
+from array import array
+
+import QuadTreeHelpers as quadtree_helpers
+from Point import Point
+from QuadTree import QuadTree
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Streaming ingestion of point files: CSV rows or raw little-endian float64 (x, y) pairs are read chunk by chunk
+# and each chunk is inserted into the tree in median order before the next one is read, so memory beyond the
+# tree itself is bounded by the chunk size instead of the file size. With NumPy, chunks are parsed, sorted and
+# deduplicated as whole arrays; without it, the same steps run on Python floats.
+DEFAULT_CHUNK_SIZE = 1 << 16
+_PAIR_SIZE = 16
+
+
+def iter_csv_coordinates(path: str, chunk_size: int = DEFAULT_CHUNK_SIZE, x_column: int = 0, y_column: int = 1,
+                         delimiter: str = ',', skip_header: bool = False):
+    # Chunks of up to chunk_size rows as (xs, ys) pairs: NumPy arrays when NumPy is available, typed arrays
+    # otherwise. Blank lines are skipped.
+    with open(path, newline='') as f:
+        if np is not None:
+            if skip_header:
+                next(f, None)
+            rows = (line for line in f if line.strip('\r\n'))
+            while True:
+                lines = list(itertools.islice(rows, chunk_size))
+                if not lines:
+                    return
+                table = np.loadtxt(lines, delimiter=delimiter, usecols=(x_column, y_column), ndmin=2, quotechar='"')
+                if len(table):
+                    yield table[:, 0], table[:, 1]
+        rows = csv.reader(f, delimiter=delimiter)
+        if skip_header:
+            next(rows, None)
+        xs, ys = array('d'), array('d')
+        for row in rows:
+            if row:
+                xs.append(float(row[x_column]))
+                ys.append(float(row[y_column]))
+                if len(xs) == chunk_size:
+                    yield xs, ys
+                    xs, ys = array('d'), array('d')
+        if xs:
+            yield xs, ys
+
+
+def iter_binary_coordinates(path: str, chunk_size: int = DEFAULT_CHUNK_SIZE):
+    # Each chunk is decoded in a single np.frombuffer or array.frombytes call instead of unpacking the pairs one
+    # by one.
+    with open(path, 'rb') as f:
+        while True:
+            data = f.read(_PAIR_SIZE * chunk_size)
+            if not data:
+                return
+            if len(data) % _PAIR_SIZE:
+                raise ValueError('Truncated point file: ' + str(len(data) % _PAIR_SIZE) + ' trailing bytes')
+            if np is not None:
+                coordinates = np.frombuffer(data, dtype='<f8')
+            else:
+                coordinates = array('d')
+                coordinates.frombytes(data)
+                if sys.byteorder != 'little':
+                    coordinates.byteswap()
+            yield coordinates[0::2], coordinates[1::2]
+
+
+def write_binary_points(points, path: str):
+    with open(path, 'wb') as f:
+        coordinates = array('d')
+        for p in quadtree_helpers.iter_points(points):
+            coordinates.append(p.x)
+            coordinates.append(p.y)
+            if len(coordinates) >= 2 * DEFAULT_CHUNK_SIZE:
+                _write_coordinates(coordinates, f)
+                coordinates = array('d')
+        _write_coordinates(coordinates, f)
+
+
+def _write_coordinates(coordinates, f):
+    if sys.byteorder != 'little':
+        coordinates.byteswap()
+    coordinates.tofile(f)
+
+
+def load_points(path: str, tree: QuadTree = None, file_format: str = None, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                progress=None, tree_class=QuadTree, **csv_options) -> QuadTree:
+    # file_format is 'csv' or 'binary', guessed from the extension when omitted (.csv, anything else is binary).
+    # progress, when given, is called after every chunk with the number of points read so far and the seconds
+    # elapsed, from which callers report throughput. Without a tree, the first chunk is bulk loaded into a new
+    # tree of tree_class, QuadTree or one of its subclasses; the points of the next chunks are inserted in the
+    # preorder of their own balanced shape.
+    if file_format is None:
+        file_format = 'csv' if path.lower().endswith('.csv') else 'binary'
+    if file_format == 'csv':
+        chunks = iter_csv_coordinates(path, chunk_size, **csv_options)
+    elif file_format == 'binary':
+        chunks = iter_binary_coordinates(path, chunk_size)
+    else:
+        raise ValueError('Unknown point file format ' + repr(file_format))
+    points_read = 0
+    start_time = time.perf_counter()
+    for xs, ys in chunks:
+        xs_sorted, ys_sorted = quadtree_helpers.sort_unique(xs, ys)
+        unique = [Point(x, y) for x, y in zip(xs_sorted, ys_sorted)]
+        shape = quadtree_helpers.balanced_shape(xs_sorted, ys_sorted)
+        if tree is None:
+            tree = tree_class._from_shape(unique, shape)
+            tree._known_size = len(unique)
+        else:
+            for idx in shape[0]:
+                tree.insert(unique[idx])
+        points_read += len(xs)
+        if progress is not None:
+            progress(points_read, time.perf_counter() - start_time)
+    return tree if tree is not None else tree_class()
@@ -1,7 +1,10 @@
 import copy
+import heapq
+import itertools
 import math
 from typing import List
 
+import QuadTreeHelpers as quadtree_helpers
 from Point import Point
 
 
@@ -19,124 +22,476 @@ class QuadTree:
     _EXTREME_POINTS = [_EXTREME_TOPLEFT_POINT, _EXTREME_TOPRIGHT_POINT, _EXTREME_BOTTOMRIGHT_POINT,
                        _EXTREME_BOTTOMLEFT_POINT]
 
+    # Lazy deletion: a deleted node keeps its point as a split but is skipped by queries. The root counts
+    # its dead nodes and rebuilds the whole tree once they pass this fraction of all nodes.
+    lazy_rebuild_threshold = 0.5
+    _deleted = False
+    _deleted_count = 0
+    _known_size = 0
+
     def __init__(self, point: Point = None):
         self.point = point
         self.sons = [None, None, None, None]  # TOPLEFT, TOPRIGHT, BOTTOMRIGHT, BOTTOMLEFT
+        # Last node of the chain of sons in each direction, None when the node itself has no son there. The
+        # candidate of a quadrant is the end of its son's chain towards the conjugate quadrant.
+        self._ends = [None, None, None, None]
+
+    @classmethod
+    def from_points(cls, points) -> 'QuadTree':
+        return cls._bulk_load(points, cls._build_balanced)
+
+    @classmethod
+    def _bulk_load(cls, points, build) -> 'QuadTree':
+        # build lays out points sorted by (x, y) without duplicates as a tree of cls and returns its root, as
+        # _build_balanced does; parallel_from_points passes its own. Subclasses that keep more than one point per
+        # coordinate override this rather than from_points, so that both builds keep it.
+        unique = quadtree_helpers.sorted_unique_points(points)
+        if not unique:
+            return cls()
+        tree = build(unique)
+        tree._known_size = len(unique)
+        return tree
+
+    @classmethod
+    def _build_balanced(cls, ordered: List[Point]) -> 'QuadTree':
+        # ordered is sorted by (x, y) without duplicates; the split points come from balanced_shape, which
+        # keeps the depth within about log2(n) even when coordinates tie.
+        shape = quadtree_helpers.balanced_shape([pt.x for pt in ordered], [pt.y for pt in ordered])
+        return cls._from_shape(ordered, shape)
+
+    @classmethod
+    def _from_shape(cls, ordered: List[Point], shape) -> 'QuadTree':
+        order, masks = shape
+        nodes = [cls(ordered[idx]) for idx in order]
+        for node, (parent, child_idx) in zip(nodes[1:], quadtree_helpers.iter_shape_links(masks)):
+            nodes[parent].sons[child_idx] = node
+        for node in reversed(nodes):
+            node._refresh_node()
+        return nodes[0]
+
+    def save(self, path: str):
+        import MappedQuadTree as mapped_quadtree
+        mapped_quadtree.write_preorder(self, path)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = False):
+        # With mmap=True the tree is not materialized: a read-only MappedQuadTree answers search and range
+        # queries straight from the mapped file. Payloads are not stored, only coordinates.
+        import MappedQuadTree as mapped_quadtree
+        if mmap:
+            return mapped_quadtree.MappedQuadTree(path)
+        xs, ys, sons = mapped_quadtree.read_preorder(path)
+        nodes = [cls(Point(x, y)) for x, y in zip(xs, ys)]
+        for idx, node in enumerate(nodes):
+            for son_idx in range(4):
+                son = sons[4 * idx + son_idx]
+                if son >= 0:
+                    node.sons[son_idx] = nodes[son]
+        if not nodes:
+            return cls()
+        for node in reversed(nodes):
+            node._refresh_node()
+        nodes[0]._known_size = len(nodes)
+        return nodes[0]
+
+    def clone(self, share_points: bool = True) -> 'QuadTree':
+        root = self._copy_node(share_points)
+        copies = [root]
+        pending = [(self, root)]
+        while pending:
+            node, node_copy = pending.pop()
+            for idx, son in enumerate(node.sons):
+                if son:
+                    son_copy = son._copy_node(share_points)
+                    node_copy.sons[idx] = son_copy
+                    pending.append((son, son_copy))
+                    copies.append(son_copy)
+        # Sons are copied after their parent, so walking the copies backwards refreshes every node after its sons.
+        for node_copy in reversed(copies):
+            node_copy._refresh_node()
+        root._known_size = len(copies) if self.point else 0
+        return root
+
+    def __copy__(self):
+        return self.clone()
+
+    def __deepcopy__(self, memo):
+        # Unlike clone(), the copy shares no points or payloads with this tree: every node attribute but the links
+        # between nodes is deep copied through memo.
+        tree = self.clone()
+        memo[id(self)] = tree
+        for node in [tree] + tree.get_all_child_points():
+            for name, value in node.__dict__.items():
+                if name not in ('sons', '_ends'):
+                    node.__dict__[name] = copy.deepcopy(value, memo)
+        return tree
+
+    def _copy_node(self, share_points: bool) -> 'QuadTree':
+        node = object.__new__(self.__class__)
+        attributes = self.__dict__.copy()
+        attributes['sons'] = [None, None, None, None]
+        node.__dict__ = attributes
+        if not share_points and self.point:
+            node.point = Point(self.point.x, self.point.y, self.point.payload)
+        return node
+
+    def enable_stats(self, recorder=None):
+        # Opt-in profiling: the nodes switch to an instrumented class that records node visits, reinsertions and
+        # per-phase timings into the returned StatsRecorder, until disable_stats() switches them back.
+        import InstrumentedQuadTree as instrumented_quadtree
+        return instrumented_quadtree.enable_stats(self, recorder)
+
+    def disable_stats(self):
+        import InstrumentedQuadTree as instrumented_quadtree
+        instrumented_quadtree.disable_stats(self)
+
+    def shape_stats(self):
+        import InstrumentedQuadTree as instrumented_quadtree
+        return instrumented_quadtree.tree_shape(self)
 
     def insert(self, p: Point):
-        self.insert_quadtree(QuadTree(p))
+        if self.insert_quadtree(type(self)(p)):
+            self._known_size += 1
 
     def insert_quadtree(self, qt: 'QuadTree'):
+        # True when qt became a node of the tree, False when its point was already stored.
         if not self.point:
-            self.point = qt.point
-            self.sons = qt.sons
-        elif self.point == qt.point:
-            return
-        else:
-            child_idx = self._select_child(qt.point)
-            if self.sons[child_idx]:
-                self.sons[child_idx].insert_quadtree(qt)
-            else:
-                self.sons[child_idx] = qt
+            self._adopt(qt)
+            return True
+        node = run_top = self
+        run_idx = None
+        while node.point != qt.point:
+            child_idx = node._select_child(qt.point)
+            if child_idx != run_idx:
+                run_top, run_idx = node, child_idx
+            son = node.sons[child_idx]
+            if son is None:
+                node.sons[child_idx] = qt
+                # _refresh_run, inlined for the hot path.
+                end = qt._ends[child_idx] or qt
+                while run_top is not qt:
+                    run_top._ends[child_idx] = end
+                    run_top = run_top.sons[child_idx]
+                return True
+            node = son
+        self._insert_stored(node, qt)
+        return False
+
+    def _insert_stored(self, node: 'QuadTree', qt: 'QuadTree'):
+        if node._deleted:
+            node.point = qt.point
+            node._deleted = False
+            self._deleted_count -= 1
+
+    def _adopt(self, qt: 'QuadTree'):
+        self.point = qt.point
+        self.sons = qt.sons
+        self._ends = qt._ends
+        self._deleted = qt._deleted
 
     def search(self, p: Point):
         if not self.point:
             return None
-        elif self.point == p:
-            return self
-        else:
-            child_idx = self._select_child(p)
-            if self.sons[child_idx]:
-                return self.sons[child_idx].search(p)
-            else:
+        node = self
+        while node.point != p:
+            node = node.sons[node._select_child(p)]
+            if node is None:
                 return None
+        return None if node._deleted else node
 
-    def delete_with_full_reinsertion(self, p: Point):
+    def range_query(self, xmin, ymin, xmax, ymax) -> List[Point]:
+        return list(self.iter_range_query(xmin, ymin, xmax, ymax))
+
+    def count_range_query(self, xmin, ymin, xmax, ymax) -> int:
+        return sum(1 for _ in self.iter_range_query(xmin, ymin, xmax, ymax))
+
+    def iter_range_query(self, xmin, ymin, xmax, ymax):
+        return (node.point for node in self._walk_range_query(xmin, ymin, xmax, ymax) if node is not None)
+
+    def nearest(self, p: Point, k: int = 1, metric='l2') -> List[Point]:
+        return [point for _, point in itertools.islice(self._iter_nearest(p, metric), k)]
+
+    def within_radius(self, p: Point, r, metric='l2') -> List[Point]:
+        return [point for _, point in itertools.takewhile(lambda dp: dp[0] <= r, self._iter_nearest(p, metric))]
+
+    def _iter_nearest(self, p: Point, metric):
+        return (found for found in self._walk_nearest(p, metric) if found is not None)
+
+    # The _walk generators run the scans one visited node at a time, yielding None for the nodes that report
+    # nothing, so that callers such as the AsyncQuadTree scans can pause between any two nodes.
+
+    def _walk_points(self):
+        # Preorder, starting with this node's point.
+        pending = [self] if self.point else []
+        while pending:
+            node = pending.pop()
+            yield None if node._deleted else node.point
+            pending += [son for son in reversed(node.sons) if son]
+
+    def _walk_range_query(self, xmin, ymin, xmax, ymax):
+        # Yields the nodes themselves, so that subclasses can read what else they keep on the nodes in the box.
+        pending = [self] if self.point else []
+        while pending:
+            node = pending.pop()
+            x, y = node.point.x, node.point.y
+            yield node if xmin <= x <= xmax and ymin <= y <= ymax and not node._deleted else None
+            sons = node.sons
+            for son_idx in quadtree_helpers.overlapped_quadrants(x, y, xmin, ymin, xmax, ymax):
+                if sons[son_idx]:
+                    pending.append(sons[son_idx])
+
+    def _walk_nearest(self, p: Point, metric):
+        # Best-first traversal: the heap mixes points keyed on their distance and sons keyed on the
+        # minimum distance to their quadrant region, so (distance, point) pairs come out in increasing order.
         if not self.point:
             return
-        elif self.point == p:
-            child_points = self.get_all_child_points()
-            self.__init__()
-            for cp in child_points:
-                self.insert(cp.point)
+        distance = self._METRICS[metric] if isinstance(metric, str) else metric
+        region = (self._EXTREME_BOTTOMLEFT_POINT.x, self._EXTREME_BOTTOMLEFT_POINT.y,
+                  self._EXTREME_TOPRIGHT_POINT.x, self._EXTREME_TOPRIGHT_POINT.y)
+        tie_breaker = itertools.count()
+        heap = [(0., next(tie_breaker), self, region)]
+        while heap:
+            dist, _, item, region = heapq.heappop(heap)
+            if region is None:
+                yield dist, item
+                continue
+            if not item._deleted:
+                heapq.heappush(heap, (distance(item.point, p), next(tie_breaker), item.point, None))
+            for idx, son in enumerate(item.sons):
+                if son:
+                    son_region = item._son_bounds(region, idx)
+                    if son_region is not None:
+                        heapq.heappush(heap, (self._region_distance(p, son_region, distance), next(tie_breaker),
+                                              son, son_region))
+            yield None
+
+    def _son_bounds(self, region, idx: int):
+        # Area that may hold the points of a son, None when the son holds none.
+        return self._son_region(region, self.point, idx)
+
+    def _son_region(self, region, point: Point, idx: int):
+        xmin, ymin, xmax, ymax = region
+        if idx == self._TOPLEFT:
+            return xmin, point.y, point.x, ymax
+        elif idx == self._TOPRIGHT:
+            return point.x, point.y, xmax, ymax
+        elif idx == self._BOTTOMRIGHT:
+            return point.x, ymin, xmax, point.y
         else:
-            child_idx = self._select_child(p)
-            if self.sons[child_idx]:
-                self.sons[child_idx].delete_with_full_reinsertion(p)
-                if not self.sons[child_idx].point:
-                    self.sons[child_idx] = None
+            return xmin, ymin, point.x, point.y
+
+    @staticmethod
+    def _region_distance(p: Point, region, distance):
+        xmin, ymin, xmax, ymax = region
+        closest_x = min(max(p.x, xmin), xmax)
+        closest_y = min(max(p.y, ymin), ymax)
+        if closest_x == p.x and closest_y == p.y:
+            return 0.
+        return distance(Point(closest_x, closest_y), p)
+
+    def delete_with_full_reinsertion(self, p: Point):
+        run_top, parent, node, child_idx = self._find_with_run(p)
+        if node is None:
+            return
+        if node._deleted:
+            self._deleted_count -= 1
+        self._known_size -= 1
+        node._remove_with_full_reinsertion(parent, child_idx)
+        if parent is not None:
+            self._refresh_run(run_top, parent, child_idx)
+
+    def _remove_with_full_reinsertion(self, parent: 'QuadTree', child_idx: int):
+        child_points = self.get_all_child_points()
+        self.__init__()
+        for cp in child_points:
+            # The detached nodes are reinserted as they are (keeping their deleted mark) instead of wrapping
+            # their points in new nodes.
+            cp.sons = [None, None, None, None]
+            cp._ends = [None, None, None, None]
+            self.insert_quadtree(cp)
+        if parent is not None and not self.point:
+            parent.sons[child_idx] = None
 
     def delete_with_partial_reinsertion(self, p: Point):
-        if not self.point:
+        run_top, parent, node, child_idx = self._find_with_run(p)
+        if node is None:
             return
-        elif self.point == p:
-            if not self._has_sons():
-                self.__init__()
-            else:
-                selected_candidate_child = self._select_node_to_change(p)
-                selected_node = self.sons[selected_candidate_child].find_candidate(selected_candidate_child)
-                adjacent_nodes = self._get_adjacent_nodes(selected_candidate_child)
-                nodes_to_reinsert = []
-                for adj_node in (an for an in adjacent_nodes if self.sons[an]):
-                    nodes_to_reinsert += self._apply_adj(adj_node, p, selected_node.point)
-                self.sons[selected_candidate_child].newroot(selected_candidate_child, self, selected_node.point)
-                self._replace_deleted_node(selected_node)
-                for node_to_reinsert in nodes_to_reinsert:
-                    self.insert_quadtree(node_to_reinsert)
+        if node._deleted:
+            self._deleted_count -= 1
+        self._known_size -= 1
+        if not node._has_sons():
+            node.__init__()
         else:
-            child_idx = self._select_child(p)
-            if self.sons[child_idx]:
-                self.sons[child_idx].delete_with_partial_reinsertion(p)
-                if not self.sons[child_idx].point:
-                    self.sons[child_idx] = None
+            candidate_nodes = node._candidate_nodes()
+            selected_candidate_child = node._select_node_to_change(p, candidate_nodes)
+            spine = node.sons[selected_candidate_child]._candidate_spine(selected_candidate_child)
+            selected_node = spine[-1]
+            if node._spine_has_ties(spine):
+                node._remove_with_full_reinsertion(parent, child_idx)
+                if parent is not None:
+                    self._refresh_run(run_top, parent, child_idx)
+                return
+            adjacent_nodes = node._get_adjacent_nodes(selected_candidate_child)
+            roots = [(root, an) for root in [node] + spine for an in adjacent_nodes]
+            nodes_to_reinsert = node._collect_crosshatched(roots, p, selected_node.point)
+            # The spine stays in place, so it still gives the parent of the selected node.
+            if len(spine) > 1:
+                node._replace_deleted_node(selected_node, spine[-2], node._conjugate(selected_candidate_child))
+            else:
+                node._replace_deleted_node(selected_node, node, selected_candidate_child)
+            # The reinserts below descend from node, so it and the spine must be right before they start.
+            self._refresh_path([node] + spine[:-1])
+            for node_to_reinsert in node._detach_subtrees(nodes_to_reinsert):
+                node.insert_quadtree(node_to_reinsert)
+        if parent is not None:
+            if not node.point:
+                parent.sons[child_idx] = None
+            self._refresh_run(run_top, parent, child_idx)
+
+    def delete_lazy(self, p: Point):
+        node = self.search(p)
+        if node is None:
+            return
+        node._deleted = True
+        self._deleted_count += 1
+        if self._deleted_count > self.lazy_rebuild_threshold * self._known_size:
+            # The root keeps its node count up to date, but subtrees added through insert_quadtree are not
+            # counted, so the size is recounted before rebuilding; the count is amortized against the deletions.
+            self._known_size = self._node_count()
+            if self._deleted_count > self.lazy_rebuild_threshold * self._known_size:
+                self.compact()
+
+    def _node_count(self) -> int:
+        return 1 + len(self.get_all_child_points())
+
+    def compact(self):
+        nodes = [self] + self.get_all_child_points() if self.point else []
+        live_points = [node.point for node in nodes if not node._deleted]
+        if self.point:
+            self._adopt(type(self).from_points(live_points))
+        self._deleted_count = 0
+        self._known_size = len(live_points)
+
+    def _live_tree(self) -> 'QuadTree':
+        if not self._deleted_count:
+            return self
+        live_tree = self.clone()
+        live_tree.compact()
+        return live_tree
+
+    def _spine_has_ties(self, spine: List['QuadTree']):
+        # Partial reinsertion keeps the spine leading to the candidate in place, which only holds when no
+        # spine node shares a coordinate with the candidate; such ties fall back to full reinsertion.
+        selected_point = spine[-1].point
+        return any(node.point.x == selected_point.x or node.point.y == selected_point.y for node in spine[:-1])
+
+    @staticmethod
+    def _detach_subtrees(subtrees: List['QuadTree']) -> List['QuadTree']:
+        # Subtrees in the crosshatched region are reinserted node by node: their inner splits were made
+        # against ancestors that are being replaced, so attaching them whole can leave points in the wrong quadrant.
+        nodes = []
+        for subtree in subtrees:
+            nodes.append(subtree)
+            nodes += subtree.get_all_child_points()
+        for node in nodes:
+            node.sons = [None, None, None, None]
+            node._ends = [None, None, None, None]
+        return nodes
+
+    @staticmethod
+    def _refresh_path(path: List['QuadTree']):
+        # Bottom up, so every node is refreshed from sons that are already right.
+        for node in reversed(path):
+            node._refresh_node()
+
+    @staticmethod
+    def _refresh_run(run_top: 'QuadTree', parent: 'QuadTree', child_idx: int):
+        # Called once the son of parent towards child_idx changed. The only chains through that son are the ones
+        # towards child_idx of parent and of the ancestors that reach parent in that direction, from run_top down.
+        son = parent.sons[child_idx]
+        end = son._ends[child_idx] or son if son else None
+        parent._ends[child_idx] = end
+        end = end or parent
+        node = run_top
+        while node is not parent:
+            node._ends[child_idx] = end
+            node = node.sons[child_idx]
+
+    def _refresh_node(self):
+        topleft, topright, bottomright, bottomleft = self.sons
+        self._ends = [topleft and (topleft._ends[self._TOPLEFT] or topleft),
+                      topright and (topright._ends[self._TOPRIGHT] or topright),
+                      bottomright and (bottomright._ends[self._BOTTOMRIGHT] or bottomright),
+                      bottomleft and (bottomleft._ends[self._BOTTOMLEFT] or bottomleft)]
+
+    def _find_with_parent(self, p: Point):
+        return self._find_with_run(p)[1:]
+
+    def _find_with_run(self, p: Point):
+        # Also returns the top of the run of steps towards child_idx that ends at the parent, see _refresh_run.
+        if not self.point:
+            return None, None, None, None
+        run_top, parent, node, child_idx = None, None, self, None
+        while node.point != p:
+            idx = node._select_child(p)
+            if idx != child_idx:
+                run_top, child_idx = node, idx
+            parent, node = node, node.sons[idx]
+            if node is None:
+                return None, None, None, None
+        return run_top, parent, node, child_idx
 
     def __repr__(self):
-        return str(self.point) + ': (' + \
-               str(self.sons[self._TOPLEFT]) + ', ' + \
-               str(self.sons[self._TOPRIGHT]) + ', ' + \
-               str(self.sons[self._BOTTOMRIGHT]) + ', ' + \
-               str(self.sons[self._BOTTOMLEFT]) + ')'
+        return quadtree_helpers.repr_tree(self, lambda node: node.point, lambda node: node.sons)
 
     def get_all_child_points(self):
-        child_trees = [child for child in self.sons if child]
-        subchild_trees = []
-        for c in child_trees:
-            subchild_trees += c.get_all_child_points()
-        return child_trees + subchild_trees
-
-    def _replace_deleted_node(self, selected_node: 'QuadTree'):
-        selected_point = copy.copy(selected_node.point)
-        self.delete_with_full_reinsertion(selected_node.point)
+        # Same order as expanding every node into its sons followed by each son's own expansion.
+        child_trees = []
+        pending = [self]
+        while pending:
+            node = pending.pop()
+            sons = [child for child in node.sons if child]
+            child_trees += sons
+            pending += reversed(sons)
+        return child_trees
+
+    def _replace_deleted_node(self, selected_node: 'QuadTree', parent: 'QuadTree', child_idx: int):
+        selected_point, selected_deleted = selected_node.point, selected_node._deleted
+        selected_node._remove_with_full_reinsertion(parent, child_idx)
         self.point = selected_point
+        self._deleted = selected_deleted
 
-    def _apply_adj(self, adj_node: int, point_to_delete: Point, selected_point: Point):
-        nodes_to_reinsert, to_remove = self.sons[adj_node].adj(point_to_delete, selected_point)
-        if to_remove:
-            self.sons[adj_node] = None
+    def _collect_crosshatched(self, roots, point_to_be_deleted: Point, selected_point: Point) -> List['QuadTree']:
+        # roots are (parent, quadrant) pairs: the sons of the deleted node and of the candidate spine that lie
+        # next to the candidate quadrant. Subtrees rooted in the crosshatched region are cut from their parent
+        # and returned; elsewhere only the sons on the susceptible sides, those that are neither towards the
+        # candidate nor towards the node itself, are followed. Depth first in the order of roots, into one list.
+        up_bound = max(point_to_be_deleted.y, selected_point.y)
+        bottom_bound = min(point_to_be_deleted.y, selected_point.y)
+        right_bound = max(point_to_be_deleted.x, selected_point.x)
+        left_bound = min(point_to_be_deleted.x, selected_point.x)
+        direction_change = self.get_point_direction(selected_point, point_to_be_deleted)
+        nodes_to_reinsert = []
+        followed = []
+        pending = roots[::-1]
+        while pending:
+            parent, idx = pending.pop()
+            node = parent.sons[idx]
+            if not node:
+                continue
+            # Half-open like get_point_direction: these are the points whose side changes between both splits.
+            if up_bound > node.point.y >= bottom_bound or left_bound <= node.point.x < right_bound:
+                parent.sons[idx] = None
+                nodes_to_reinsert.append(node)
+            else:
+                direction_point = self.get_point_direction(node.point, point_to_be_deleted)
+                pending += [(node, d) for d in reversed(self._POINT_DIRECTIONS)
+                            if d != direction_change and d != direction_point]
+                followed.append(node)
+        # Cutting subtrees changes the nodes that were followed to reach them, which come after their parents.
+        self._refresh_path(followed)
         return nodes_to_reinsert
 
-    def adj(self, point_to_be_deleted: Point, selected_point: Point):
-        if not self.point_in_crosshatched(point_to_be_deleted, selected_point):
-            susceptible_sons = self._get_susceptible_nodes(point_to_be_deleted, selected_point)
-            nodes_to_reinsert = []
-            for susceptible_child in (sc for sc in susceptible_sons if self.sons[sc]):
-                nodes_to_reinsert += self._apply_adj(susceptible_child, point_to_be_deleted, selected_point)
-            return nodes_to_reinsert, False
-        else:
-            return [self], True
-
-    def newroot(self, i, node_to_be_deleted: 'QuadTree', selected_point: Point):
-        adjacent_nodes = self._get_adjacent_nodes(i)
-        for adj_node in (an for an in adjacent_nodes if self.sons[an]):
-            nodes_to_reinsert = self._apply_adj(adj_node, node_to_be_deleted.point, selected_point)
-            for node in nodes_to_reinsert:
-                if node_to_be_deleted.sons[adj_node]:
-                    node_to_be_deleted.sons[adj_node].insert_quadtree(node)
-                else:
-                    node_to_be_deleted.sons[adj_node] = node
-        if self.sons[self._conjugate(i)]:
-            self.sons[self._conjugate(i)].newroot(i, node_to_be_deleted, selected_point)
-
     def _select_child(self, p: Point):
         return self.get_point_direction(p, self.point)
 
@@ -157,38 +512,42 @@ class QuadTree:
         return (n + 2) % 4
 
     def find_candidate(self, quadrant: int):
+        return self._ends[self._conjugate(quadrant)] or self
+
+    def _candidate_spine(self, quadrant: int) -> List['QuadTree']:
+        # The whole chain that ends with the candidate; the crosshatched region needs every node of it.
         conjugate_quadrant = self._conjugate(quadrant)
-        if not self.sons[conjugate_quadrant]:
-            return self
-        else:
-            return self.sons[conjugate_quadrant].find_candidate(quadrant)
+        spine = [self]
+        while spine[-1].sons[conjugate_quadrant]:
+            spine.append(spine[-1].sons[conjugate_quadrant])
+        return spine
 
-    def _get_candidates(self):
-        candidates = []
-        for idx, child in enumerate(self.sons):
-            if child:
-                candidates.append(child.find_candidate(idx).point)
-            else:
-                candidates.append(self._EXTREME_POINTS[idx])
-        return candidates
+    def _candidate_nodes(self):
+        return [child._ends[self._conjugate(idx)] or child if child else None for idx, child in enumerate(self.sons)]
 
-    def _check_first_property(self, candidates: List[Point]):
-        p_tl = candidates[self._TOPLEFT]
-        p_tr = candidates[self._TOPRIGHT]
-        p_bl = candidates[self._BOTTOMLEFT]
-        p_br = candidates[self._BOTTOMRIGHT]
+    def _get_candidates(self, candidate_nodes=None):
+        # candidate_nodes lets a delete reuse the nodes it already looked up.
+        candidate_nodes = candidate_nodes if candidate_nodes is not None else self._candidate_nodes()
+        return [cn.point if cn else self._EXTREME_POINTS[idx] for idx, cn in enumerate(candidate_nodes)]
+
+    @classmethod
+    def _check_first_property(cls, candidates: List[Point]):
+        p_tl = candidates[cls._TOPLEFT]
+        p_tr = candidates[cls._TOPRIGHT]
+        p_bl = candidates[cls._BOTTOMLEFT]
+        p_br = candidates[cls._BOTTOMRIGHT]
 
         candidates_fp_x = [False] * 4
-        candidates_fp_x[self._TOPLEFT] = p_tl.y < p_tr.y
-        candidates_fp_x[self._TOPRIGHT] = p_tr.y < p_tl.y
-        candidates_fp_x[self._BOTTOMLEFT] = p_bl.y > p_br.y
-        candidates_fp_x[self._BOTTOMRIGHT] = p_br.y > p_bl.y
+        candidates_fp_x[cls._TOPLEFT] = p_tl.y < p_tr.y
+        candidates_fp_x[cls._TOPRIGHT] = p_tr.y < p_tl.y
+        candidates_fp_x[cls._BOTTOMLEFT] = p_bl.y > p_br.y
+        candidates_fp_x[cls._BOTTOMRIGHT] = p_br.y > p_bl.y
 
         candidates_fp_y = [False] * 4
-        candidates_fp_y[self._TOPLEFT] = p_tl.x > p_bl.x
-        candidates_fp_y[self._BOTTOMLEFT] = p_bl.x > p_tl.x
-        candidates_fp_y[self._TOPRIGHT] = p_tr.x < p_br.x
-        candidates_fp_y[self._BOTTOMRIGHT] = p_br.x < p_tr.x
+        candidates_fp_y[cls._TOPLEFT] = p_tl.x > p_bl.x
+        candidates_fp_y[cls._BOTTOMLEFT] = p_bl.x > p_tl.x
+        candidates_fp_y[cls._TOPRIGHT] = p_tr.x < p_br.x
+        candidates_fp_y[cls._BOTTOMRIGHT] = p_br.x < p_tr.x
 
         return [x and y for (x, y) in zip(candidates_fp_x, candidates_fp_y)]
 
@@ -196,39 +555,39 @@ class QuadTree:
     def _get_adjacent_nodes(node: int):
         return [(node + 1) % 4, (node - 1) % 4]
 
-    def point_in_crosshatched(self, point_to_be_deleted: Point, selected_point: Point):
-        up_bound = max(point_to_be_deleted.y, selected_point.y)
-        bottom_bound = min(point_to_be_deleted.y, selected_point.y)
-        right_bound = max(point_to_be_deleted.x, selected_point.x)
-        left_bound = min(point_to_be_deleted.x, selected_point.x)
-        return up_bound > self.point.y > bottom_bound or left_bound < self.point.x < right_bound
-
-    def _get_susceptible_nodes(self, point_to_be_deleted: Point, selected_point: Point):
-        direction_change = self.get_point_direction(selected_point, point_to_be_deleted)
-        direction_point = self.get_point_direction(self.point, point_to_be_deleted)
-        directions = [d for d in list(self._POINT_DIRECTIONS) if d not in [direction_change, direction_point]]
-        return directions
-
     def _has_sons(self):
         return any(c is not None for c in self.sons)
 
-    def _select_node_to_change(self, p: Point):
-        candidates = self._get_candidates()
-        candidates_fp = self._check_first_property(candidates)
+    def _select_node_to_change(self, p: Point, candidate_nodes=None):
+        return self._select_candidate(self._get_candidates(candidate_nodes), p)
+
+    @classmethod
+    def _select_candidate(cls, candidates: List[Point], p: Point) -> int:
+        # The quadrant whose candidate replaces p, from the candidate points of the four quadrants; shared with
+        # ArrayQuadTree, which has no nodes to hand to _select_node_to_change.
+        candidates_fp = cls._check_first_property(candidates)
         if candidates_fp.count(True) == 1:
             return candidates_fp.index(True)
         elif candidates_fp.count(True) > 1:
             l1_values = [math.inf] * len(candidates)
             for idx, c_fp in enumerate(candidates_fp):
                 if c_fp:
-                    l1_values[idx] = self._compute_l1(candidates[idx], p)
+                    l1_values[idx] = cls._compute_l1(candidates[idx], p)
             selected_candidate, _ = min(enumerate(l1_values), key=lambda v: v[1])
             return selected_candidate
         else:
-            l1_values = [self._compute_l1(cand, p) for cand in candidates]
+            l1_values = [cls._compute_l1(cand, p) for cand in candidates]
             selected_candidate, _ = min(enumerate(l1_values), key=lambda v: v[1])
             return selected_candidate
 
     @staticmethod
     def _compute_l1(cand, p):
         return abs(p.x - cand.x) + abs(p.y - cand.y)
+
+    @staticmethod
+    def _compute_l2(cand, p):
+        return math.hypot(p.x - cand.x, p.y - cand.y)
+
+    # Custom metrics are callables with the same signature; they must grow with |dx| and |dy| for the
+    # region distances to stay lower bounds.
+    _METRICS = {'l1': _compute_l1.__func__, 'l2': _compute_l2.__func__}
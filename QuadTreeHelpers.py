@@ -0,0 +1,223 @@
+from array import array
+from bisect import bisect_left
+from typing import List
+
+from Point import Point
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Helpers shared by the point quadtree engines: quadrant geometry, tree rendering and the median-split layout
+# every bulk build starts from. Quadrants are numbered as in QuadTree: TOPLEFT, TOPRIGHT, BOTTOMRIGHT, BOTTOMLEFT.
+_TOPLEFT = 0
+_TOPRIGHT = 1
+_BOTTOMRIGHT = 2
+_BOTTOMLEFT = 3
+# Index lists longer than this are partitioned with NumPy, when available, during bulk builds.
+_VECTORIZED_SIZE = 1024
+
+
+# The quadrants (TOPLEFT, TOPRIGHT, BOTTOMRIGHT, BOTTOMLEFT) overlapping a query box, for each combination of the
+# sides of the split point it reaches: bit 0 left, bit 1 right, bit 2 bottom, bit 3 top.
+_OVERLAPPED_QUADRANTS = [tuple(son_idx for son_idx, sides in enumerate((0b1001, 0b1010, 0b0110, 0b0101))
+                               if sides & mask == sides) for mask in range(16)]
+
+
+def overlapped_quadrants(x, y, xmin, ymin, xmax, ymax):
+    # Quadrants of the split point (x, y) that may hold points of the box, in son order. A son only holds points
+    # on its side of the split: x < split x on the left, y < split y on the bottom and >= on the opposite sides.
+    return _OVERLAPPED_QUADRANTS[(xmin < x) | (xmax >= x) << 1 | (ymin < y) << 2 | (ymax >= y) << 3]
+
+
+def repr_tree(root, point_of, sons_of, missing=None) -> str:
+    # Nested 'point: (topleft, topright, bottomright, bottomleft)' rendering of any of the point quadtrees, built
+    # without recursion so that degenerate trees of any depth can be printed.
+    parts = []
+    pending = [root]
+    while pending:
+        item = pending.pop()
+        if isinstance(item, str):
+            parts.append(item)
+        elif item == missing:
+            parts.append('None')
+        else:
+            parts.append(str(point_of(item)) + ': (')
+            sons = sons_of(item)
+            pending += [')', sons[_BOTTOMLEFT], ', ', sons[_BOTTOMRIGHT], ', ', sons[_TOPRIGHT], ', ', sons[_TOPLEFT]]
+    return ''.join(parts)
+
+
+def as_point(p) -> Point:
+    if isinstance(p, Point):
+        return p
+    return Point(p[0], p[1], p[2] if len(p) > 2 else None)
+
+
+def iter_points(points):
+    # Points from Points, (x, y[, payload]) sequences or a NumPy array, whose rows are converted to Python floats
+    # in one tolist() call instead of one NumPy scalar at a time.
+    if np is not None and isinstance(points, np.ndarray):
+        points = points.tolist()
+    return map(as_point, points)
+
+
+def sorted_unique_points(points) -> List[Point]:
+    # The points sorted by (x, y) with one point per coordinate, the first one given; what every bulk build of
+    # linked nodes starts from. (N, 2) NumPy arrays are sorted with sort_unique.
+    if np is not None and isinstance(points, np.ndarray) and points.ndim == 2 and points.shape[1] == 2:
+        xs, ys = sort_unique(points[:, 0], points[:, 1])
+        return [Point(x, y) for x, y in zip(xs, ys)]
+    ordered = sorted(iter_points(points), key=lambda pt: (pt.x, pt.y))
+    return [pt for idx, pt in enumerate(ordered)
+            if idx == 0 or pt.x != ordered[idx - 1].x or pt.y != ordered[idx - 1].y]
+
+
+def sorted_coordinates(points):
+    # The coordinates of points (Points, (x, y) pairs or an (N, 2) NumPy array) sorted by (x, y) without
+    # duplicates, as two typed arrays. With NumPy no Python tuple outlives its point.
+    if np is None:
+        coordinates = [(p.x, p.y) if isinstance(p, Point) else (p[0], p[1]) for p in points]
+        return sort_unique([x for x, _ in coordinates], [y for _, y in coordinates])
+    if isinstance(points, np.ndarray):
+        coordinates = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    else:
+        coordinates = np.fromiter(((p.x, p.y) if isinstance(p, Point) else (p[0], p[1]) for p in points),
+                                  dtype=np.dtype((np.float64, 2)))
+    return sort_unique(coordinates[:, 0], coordinates[:, 1])
+
+
+def sort_unique(xs, ys):
+    # Sorts the coordinates by (x, y) and drops duplicates, returning two typed arrays.
+    if np is None:
+        ordered = sorted(zip(xs, ys))
+        unique = [xy for idx, xy in enumerate(ordered) if idx == 0 or xy != ordered[idx - 1]]
+        return array('d', (x for x, _ in unique)), array('d', (y for _, y in unique))
+    xs, ys = np.asarray(xs, dtype=np.float64), np.asarray(ys, dtype=np.float64)
+    order = np.lexsort((ys, xs))
+    xs, ys = xs[order], ys[order]
+    keep = np.ones(len(xs), dtype=bool)
+    keep[1:] = (xs[1:] != xs[:-1]) | (ys[1:] != ys[:-1])
+    return _typed('d', xs[keep]), _typed('d', ys[keep])
+
+
+def _typed(typecode: str, values) -> array:
+    # Copies a contiguous NumPy array into a typed array without an intermediate bytes object.
+    buffer = array(typecode)
+    buffer.frombytes(memoryview(values).cast('B'))
+    return buffer
+
+
+def balanced_shape(xs, ys):
+    # Median split (Finkel & Bentley) of coordinates sorted by (x, y) without duplicates; every bulk build lays
+    # out its nodes from this shape. Returns the preorder sequence of indices and, for each of them, a bit mask
+    # of the sons it has. Partitioning keeps every quadrant sorted, so the coordinates are only sorted once.
+    order, masks = array('i'), bytearray()
+    if np is not None and len(xs) > _VECTORIZED_SIZE:
+        vectorized = np.asarray(xs, dtype=np.float64), np.asarray(ys, dtype=np.float64)
+        pending = [np.arange(len(xs))]
+    else:
+        pending = [list(range(len(xs)))] if len(xs) else []
+    while pending:
+        indices = pending.pop()
+        if len(indices) == 1:
+            order.append(indices[0])
+            masks.append(0)
+            continue
+        split = balanced_split(xs, ys, indices)
+        if isinstance(indices, list):
+            quadrants = partition(xs, ys, indices, split)
+        else:
+            quadrants = partition_vectorized(*vectorized, indices, split)
+        order.append(split)
+        masks.append(sum(1 << son_idx for son_idx, quadrant in enumerate(quadrants) if len(quadrant)))
+        pending += [quadrant for quadrant in reversed(quadrants) if len(quadrant)]
+    return order, bytes(masks)
+
+
+def iter_shape_links(masks):
+    # For every node after the root of a balanced_shape, in preorder: the position of its parent in the
+    # preorder and the quadrant of the parent it fills.
+    open_nodes = []  # (position, son quadrants still to be filled in preorder)
+    for position, mask in enumerate(masks):
+        if open_nodes:
+            parent, slots = open_nodes[-1]
+            yield parent, slots.pop()
+            if not slots:
+                open_nodes.pop()
+        if mask:
+            open_nodes.append((position, [son_idx for son_idx in (3, 2, 1, 0) if mask & (1 << son_idx)]))
+
+
+def partition(xs, ys, indices, split: int):
+    # The indices other than split, by quadrant of split, in their original order. QuadTree.get_point_direction is
+    # inlined: this loop runs once per point and level of every bulk build.
+    x, y = xs[split], ys[split]
+    quadrants = [[], [], [], []]
+    top_left, top_right, bottom_right, bottom_left = [quadrant.append for quadrant in quadrants]
+    for idx in indices:
+        if ys[idx] >= y:
+            if xs[idx] < x:
+                top_left(idx)
+            elif idx != split:
+                top_right(idx)
+        elif xs[idx] >= x:
+            bottom_right(idx)
+        else:
+            bottom_left(idx)
+    return quadrants
+
+
+def partition_vectorized(xs, ys, indices, split: int):
+    # partition for NumPy index arrays; quadrants small enough to go back to partition come out as lists.
+    top, right = ys[indices] >= ys[split], xs[indices] >= xs[split]
+    quadrants = [indices[top & ~right], indices[top & right & (indices != split)], indices[~top & right],
+                 indices[~top & ~right]]
+    return [quadrant if len(quadrant) > _VECTORIZED_SIZE else quadrant.tolist() for quadrant in quadrants]
+
+
+def balanced_split(xs, ys, indices) -> int:
+    # With distinct x values the median in (x, y) order leaves at most half of the points in each quadrant.
+    # Points sharing the median's x go right whatever their y, so with ties the split point is chosen within
+    # the median's column, or within the median's row when that is better, to balance the four quadrants. That
+    # keeps every quadrant within about half of the points and the depth within about log2(n).
+    half = len(indices) // 2
+    first, last = _tied_run(xs, indices, half)
+    if last - first == 1:
+        return indices[half]
+    size, split = _best_on_line(indices[first:last], ys, sorted(ys[idx] for idx in indices[:first]),
+                                sorted(ys[idx] for idx in indices[last:]))
+    if size > half:
+        by_row = sorted(indices, key=lambda idx: (ys[idx], xs[idx]))
+        first, last = _tied_run(ys, by_row, half)
+        row_size, row_split = _best_on_line(by_row[first:last], xs, sorted(xs[idx] for idx in by_row[:first]),
+                                            sorted(xs[idx] for idx in by_row[last:]))
+        if row_size < size:
+            split = row_split
+    return split
+
+
+def _tied_run(values, indices, position: int):
+    # Bounds of the run of indices around position that share its value.
+    first, last = position, position + 1
+    while first and values[indices[first - 1]] == values[indices[position]]:
+        first -= 1
+    while last < len(indices) and values[indices[last]] == values[indices[position]]:
+        last += 1
+    return first, last
+
+
+def _best_on_line(line, values, before, after):
+    # line holds the candidates sorted along a column (or row) and values their coordinate along it; before and
+    # after are the sorted coordinates of the points on either side of the line. The two sides are cut by the
+    # candidate's value, and the line itself joins the side after it. Returns the largest quadrant size of the
+    # best candidate and its index.
+    best = None
+    for position, idx in enumerate(line):
+        low = bisect_left(before, values[idx])
+        near = position + bisect_left(after, values[idx])
+        size = max(low, len(before) - low, near, len(line) + len(after) - 1 - near)
+        if best is None or size < best[0]:
+            best = size, idx
+    return best
@@ -0,0 +1,284 @@
+import argparse
+import json
+import math
+import platform
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+from Point import Point
+from QuadTree import QuadTree
+
+deep_tree_sizes = [250, 500, 1000, 2000]
+replications = 5
+
+default_sizes = [1000, 10000, 100000]
+distributions = ['uniform', 'clustered', 'sorted']
+operations = ['build_incremental', 'build_bulk', 'search', 'delete_with_full_reinsertion',
+              'delete_with_partial_reinsertion', 'delete_lazy', 'range_query', 'nearest']
+
+
+class RecursiveQuadTree(QuadTree):
+    # Reference copy of the former recursive hot paths, kept only to measure the iterative ones.
+
+    def insert_quadtree(self, qt: 'QuadTree'):
+        if not self.point:
+            self.point = qt.point
+            self.sons = qt.sons
+        elif self.point == qt.point:
+            return
+        else:
+            child_idx = self._select_child(qt.point)
+            if self.sons[child_idx]:
+                self.sons[child_idx].insert_quadtree(qt)
+            else:
+                self.sons[child_idx] = qt
+
+    def search(self, p: Point):
+        if not self.point:
+            return None
+        elif self.point == p:
+            return self
+        else:
+            child_idx = self._select_child(p)
+            if self.sons[child_idx]:
+                return self.sons[child_idx].search(p)
+            else:
+                return None
+
+    def delete_with_full_reinsertion(self, p: Point):
+        if not self.point:
+            return
+        elif self.point == p:
+            child_points = self.get_all_child_points()
+            self.__init__()
+            for cp in child_points:
+                self.insert(cp.point)
+        else:
+            child_idx = self._select_child(p)
+            if self.sons[child_idx]:
+                self.sons[child_idx].delete_with_full_reinsertion(p)
+                if not self.sons[child_idx].point:
+                    self.sons[child_idx] = None
+
+    def __repr__(self):
+        return str(self.point) + ': (' + \
+               str(self.sons[self._TOPLEFT]) + ', ' + \
+               str(self.sons[self._TOPRIGHT]) + ', ' + \
+               str(self.sons[self._BOTTOMRIGHT]) + ', ' + \
+               str(self.sons[self._BOTTOMLEFT]) + ')'
+
+    def get_all_child_points(self):
+        child_trees = [child for child in self.sons if child]
+        subchild_trees = []
+        for c in child_trees:
+            subchild_trees += c.get_all_child_points()
+        return child_trees + subchild_trees
+
+
+def build(tree_class, points):
+    qt = tree_class()
+    for p in points:
+        qt.insert_quadtree(tree_class(p))
+    return qt
+
+
+def time_deep_tree_operations(tree_class, points):
+    timings = {}
+    start_time = time.perf_counter_ns()
+    qt = build(tree_class, points)
+    timings['insert'] = time.perf_counter_ns() - start_time
+
+    start_time = time.perf_counter_ns()
+    for p in points:
+        qt.search(p)
+    timings['search'] = time.perf_counter_ns() - start_time
+
+    start_time = time.perf_counter_ns()
+    qt.get_all_child_points()
+    timings['get_all_child_points'] = time.perf_counter_ns() - start_time
+
+    start_time = time.perf_counter_ns()
+    repr(qt)
+    timings['repr'] = time.perf_counter_ns() - start_time
+
+    start_time = time.perf_counter_ns()
+    qt.delete_with_full_reinsertion(points[len(points) // 2])
+    timings['delete_with_full_reinsertion'] = time.perf_counter_ns() - start_time
+    return timings
+
+
+def run_deep_tree_benchmark():
+    # Sorted input degenerates into a single chain, so depth equals the number of points.
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 4 * max(deep_tree_sizes) + 100))
+    for size in deep_tree_sizes:
+        points = [Point(float(i), float(i)) for i in range(size)]
+        best = {}
+        for tree_class in (RecursiveQuadTree, QuadTree):
+            runs = [time_deep_tree_operations(tree_class, points) for _ in range(replications)]
+            best[tree_class] = {op: min(run[op] for run in runs) for op in runs[0]}
+        for op in best[QuadTree]:
+            recursive_ms = best[RecursiveQuadTree][op] / 1e6
+            iterative_ms = best[QuadTree][op] / 1e6
+            print('{:>6} {:<30} recursive {:10.3f} ms  iterative {:10.3f} ms  speedup x{:.2f}'.format(
+                size, op, recursive_ms, iterative_ms, recursive_ms / iterative_ms if iterative_ms else float('inf')))
+
+
+def generate_points(distribution: str, size: int, seed: int = 24011994):
+    rng = random.Random(seed)
+    if distribution == 'uniform':
+        return [Point(rng.uniform(0., 1000.), rng.uniform(0., 1000.)) for _ in range(size)]
+    elif distribution == 'clustered':
+        # Gaussian hotspots, about a thousand points each, like dense GPS traces around a few places.
+        centers = [(rng.uniform(0., 1000.), rng.uniform(0., 1000.)) for _ in range(max(1, size // 1000))]
+        points = []
+        for _ in range(size):
+            cx, cy = rng.choice(centers)
+            points.append(Point(rng.gauss(cx, 5.), rng.gauss(cy, 5.)))
+        return points
+    elif distribution == 'sorted':
+        # Uniform points in (x, y) order, which skews incremental builds towards one side of every node.
+        return sorted((Point(rng.uniform(0., 1000.), rng.uniform(0., 1000.)) for _ in range(size)),
+                      key=lambda p: (p.x, p.y))
+    raise ValueError('Unknown distribution ' + repr(distribution))
+
+
+def time_ns(operation, setup, repeats: int, warmup: int):
+    # setup builds the state of each run outside the timed region; warmup runs are timed but discarded.
+    timings = []
+    for run in range(warmup + repeats):
+        state = setup()
+        start_time = time.perf_counter_ns()
+        operation(state)
+        elapsed = time.perf_counter_ns() - start_time
+        if run >= warmup:
+            timings.append(elapsed)
+    return {'min': min(timings), 'median': statistics.median(timings), 'mean': statistics.mean(timings),
+            'stdev': statistics.stdev(timings) if len(timings) > 1 else 0., 'runs': timings}
+
+
+def peak_memory(operation, setup):
+    state = setup()
+    tracemalloc.start()
+    try:
+        operation(state)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def benchmark_cases(points, queries: int, seed: int = 24011994):
+    # Operation name -> (setup, operation, ops per run). Queries and deletes work on fixed samples, so their
+    # cost stays measurable on the largest trees.
+    rng = random.Random(seed)
+    qt = QuadTree.from_points(points)
+    searched = [rng.choice(points) for _ in range(queries)]
+    deleted = rng.sample(points, min(queries, len(points)))
+    side = 1000. * math.sqrt(100. / max(len(points), 1))  # boxes holding about a hundred uniform points
+    boxes = []
+    for _ in range(queries):
+        x, y = rng.uniform(0., 1000.), rng.uniform(0., 1000.)
+        boxes.append((x, y, x + side, y + side))
+    centers = [Point(rng.uniform(0., 1000.), rng.uniform(0., 1000.)) for _ in range(queries)]
+
+    def delete_all(method):
+        def delete(tree):
+            for p in deleted:
+                method(tree, p)
+        return delete
+
+    return {
+        'build_incremental': (lambda: points, lambda pts: build(QuadTree, pts), len(points)),
+        'build_bulk': (lambda: points, QuadTree.from_points, len(points)),
+        'search': (lambda: qt, lambda tree: [tree.search(p) for p in searched], len(searched)),
+        'delete_with_full_reinsertion': (qt.clone, delete_all(QuadTree.delete_with_full_reinsertion), len(deleted)),
+        'delete_with_partial_reinsertion': (qt.clone, delete_all(QuadTree.delete_with_partial_reinsertion),
+                                            len(deleted)),
+        'delete_lazy': (qt.clone, delete_all(QuadTree.delete_lazy), len(deleted)),
+        'range_query': (lambda: qt, lambda tree: [tree.range_query(*box) for box in boxes], len(boxes)),
+        'nearest': (lambda: qt, lambda tree: [tree.nearest(c, k=10) for c in centers], len(centers)),
+    }
+
+
+def run_benchmarks(sizes, selected_distributions, selected_operations, repeats: int = 5, warmup: int = 1,
+                   queries: int = 1000, memory: bool = True, log=print):
+    results = []
+    for distribution in selected_distributions:
+        for size in sizes:
+            points = generate_points(distribution, size)
+            cases = benchmark_cases(points, queries)
+            for operation in selected_operations:
+                setup, function, ops = cases[operation]
+                result = {'distribution': distribution, 'size': size, 'operation': operation, 'ops': ops}
+                result['ns'] = time_ns(function, setup, repeats, warmup)
+                result['ns_per_op'] = result['ns']['min'] / ops if ops else 0.
+                if memory and operation.startswith('build'):
+                    result['peak_bytes'] = peak_memory(function, setup)
+                results.append(result)
+                log('{:<10} {:>9} {:<32} {:14.1f} ns/op{}'.format(
+                    distribution, size, operation, result['ns_per_op'],
+                    '  peak {:.1f} MiB'.format(result['peak_bytes'] / 2 ** 20) if 'peak_bytes' in result else ''))
+    return results
+
+
+def compare(results, baseline, tolerance: float):
+    # Returns the (distribution, size, operation, ratio) entries whose best time regressed past the tolerance.
+    reference = {(r['distribution'], r['size'], r['operation']): r['ns']['min'] for r in baseline['results']}
+    regressions = []
+    for r in results:
+        key = (r['distribution'], r['size'], r['operation'])
+        if reference.get(key):
+            ratio = r['ns']['min'] / reference[key]
+            if ratio > 1. + tolerance:
+                regressions.append(key + (ratio,))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='QuadTree benchmark suite')
+    parser.add_argument('--suite', choices=['operations', 'deep'], default='operations',
+                        help='operations: build/search/delete/query timings; deep: iterative vs recursive paths')
+    parser.add_argument('--sizes', type=lambda s: [int(float(v)) for v in s.split(',')], default=default_sizes,
+                        help='comma separated tree sizes, e.g. 1e3,1e5,1e7')
+    parser.add_argument('--distributions', type=lambda s: s.split(','), default=distributions)
+    parser.add_argument('--operations', type=lambda s: s.split(','), default=operations)
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--warmup', type=int, default=1)
+    parser.add_argument('--queries', type=int, default=1000, help='searches, deletes and queries per run')
+    parser.add_argument('--no-memory', action='store_true', help='skip the tracemalloc peak memory runs')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--baseline', help='JSON results of a previous run to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='allowed slowdown against the baseline')
+    args = parser.parse_args(argv)
+
+    if args.suite == 'deep':
+        run_deep_tree_benchmark()
+        return 0
+    for name in args.distributions:
+        if name not in distributions:
+            parser.error('unknown distribution ' + name)
+    for name in args.operations:
+        if name not in operations:
+            parser.error('unknown operation ' + name)
+    results = run_benchmarks(args.sizes, args.distributions, args.operations, args.repeats, args.warmup,
+                             args.queries, not args.no_memory)
+    report = {'meta': {'python': platform.python_version(), 'implementation': platform.python_implementation(),
+                       'platform': platform.platform(), 'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                       'arguments': vars(args)},
+              'results': results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for distribution, size, operation, ratio in regressions:
+            print('REGRESSION {} {} {}: x{:.2f} slower than baseline'.format(distribution, size, operation, ratio))
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,10 +1,7 @@
-import copy
 import random
 import statistics
 import time
 
-import matplotlib.pyplot as plt
-
 from Point import Point
 from QuadTree import QuadTree
 
@@ -23,72 +20,76 @@ def generate_points(n):
     return [Point(rand(), rand()) for _ in range(n)]
 
 
-def generate_qt(points):
-    qt = QuadTree()
+class WalkedCandidatesQuadTree(QuadTree):
+    # Reference copy of the former candidate selection, which walks the four conjugate chains on every delete
+    # instead of reading the cached chain ends, kept only to measure them.
+
+    def _candidate_nodes(self):
+        candidate_nodes = []
+        for idx, child in enumerate(self.sons):
+            node = child
+            while node and node.sons[self._conjugate(idx)]:
+                node = node.sons[self._conjugate(idx)]
+            candidate_nodes.append(node)
+        return candidate_nodes
+
+
+def generate_qt(points, tree_class=QuadTree):
+    qt = tree_class()
     for p in points:
         qt.insert(p)
     return qt
 
 
-results = {}
-for test_size in test_sizes:
-    for replication in range(replications):
-        print('Executing..', test_size, replication)
-        points = generate_points(test_size)
-        qt = generate_qt(points)
-
-        points_to_delete = list(points)
-        random.shuffle(points_to_delete)
+def run_experiment():
+    results = {}
+    for test_size in test_sizes:
+        for replication in range(replications):
+            print('Executing..', test_size, replication)
+            points = generate_points(test_size)
+            qt = generate_qt(points)
+            walked_qt = generate_qt(points, WalkedCandidatesQuadTree)
 
-        qt_copy = copy.deepcopy(qt)
-        print('- Simple', test_size, replication)
-        start_time = time.time()
-        for idx, ptd in enumerate(points_to_delete):
-            # print('-- Delete point', idx)
-            qt_copy.delete_with_full_reinsertion(ptd)
-        total_time_simple = (time.time() - start_time) * 1000  # ms
+            points_to_delete = list(points)
+            random.shuffle(points_to_delete)
 
-        qt_copy = copy.deepcopy(qt)
-        print('- Improved', test_size, replication)
-        start_time = time.time()
-        for idx, ptd in enumerate(points_to_delete):
-            # print('-- Delete point', idx)
-            qt_copy.delete_with_partial_reinsertion(ptd)
-        total_time_improved = (time.time() - start_time) * 1000  # ms
+            if test_size not in results:
+                results[test_size] = {}
+            results[test_size][replication] = {
+                'Simple': time_deletions(qt, points_to_delete, QuadTree.delete_with_full_reinsertion),
+                'Improved': time_deletions(qt, points_to_delete, QuadTree.delete_with_partial_reinsertion),
+                'Walked': time_deletions(walked_qt, points_to_delete, QuadTree.delete_with_partial_reinsertion),
+                'Lazy': time_deletions(qt, points_to_delete, QuadTree.delete_lazy)}
+    return results
 
-        if test_size not in results:
-            results[test_size] = {}
-        results[test_size][replication] = {'Simple': total_time_simple, 'Improved': total_time_improved}
 
-print(results)
+def time_deletions(qt, points_to_delete, delete):
+    # Deletes every point from a fresh copy of qt; only the deletions are timed.
+    qt_copy = qt.clone()
+    start_time = time.perf_counter_ns()
+    for ptd in points_to_delete:
+        delete(qt_copy, ptd)
+    return (time.perf_counter_ns() - start_time) / 1e6  # ms
 
 
-def compute_results(version, op):
+def compute_results(results, version, op):
     return [round(op([v[version] for v in results[size].values()]), 3) for size in test_sizes]
 
 
-simple_times_mean = compute_results('Simple', statistics.mean)
-improved_times_mean = compute_results('Improved', statistics.mean)
-simple_times_min = compute_results('Simple', min)
-improved_times_min = compute_results('Improved', min)
-simple_times_max = compute_results('Simple', max)
-improved_times_max = compute_results('Improved', max)
-simple_times_stdev = compute_results('Simple', statistics.stdev)
-improved_times_stdev = compute_results('Improved', statistics.stdev)
-
-print(simple_times_mean)
-print(improved_times_mean)
-print(simple_times_min)
-print(improved_times_min)
-print(simple_times_max)
-print(improved_times_max)
-print(simple_times_stdev)
-print(improved_times_stdev)
+def plot_results(results):
+    import matplotlib.pyplot as plt
 
-plt.plot(test_sizes, simple_times_mean, c='r')
-plt.plot(test_sizes, improved_times_mean, c='b')
+    for version, color in (('Simple', 'r'), ('Improved', 'b'), ('Walked', 'c'), ('Lazy', 'g')):
+        plt.plot(test_sizes, compute_results(results, version, statistics.mean), c=color)
+    plt.legend(['Simple', 'Improved', 'Improved, walked candidates', 'Lazy'], loc='upper left')
+    plt.savefig('img/' + plot_filename)
+    plt.show()
 
-plt.legend(['Simple', 'Improved'], loc='upper left')
 
-plt.savefig('img/' + plot_filename)
-plt.show()
+if __name__ == '__main__':
+    results = run_experiment()
+    print(results)
+    for op in (statistics.mean, min, max, statistics.stdev):
+        for version in ('Simple', 'Improved', 'Walked', 'Lazy'):
+            print(compute_results(results, version, op))
+    plot_results(results)
@@ -1,6 +1,38 @@
+import asyncio
+import copy
+import math
+import os
+import pickle
+import random
+import sys
+import tempfile
+import threading
 import unittest
+from unittest import mock
 
+try:
+    import numpy as np
+
+    from BatchQuadTree import BatchQuadTree
+except ImportError:
+    np = None
+
+import ArrayQuadTree as array_quadtree
+import AsyncQuadTree as async_quadtree
+import PointLoader as point_loader
+import QuadTreeHelpers as quadtree_helpers
+from ArrayQuadTree import ArrayQuadTree
+from AugmentedQuadTree import AugmentedQuadTree
+from BalancedQuadTree import BalancedQuadTree
+from BucketQuadTree import BucketQuadTree
+from CachedQuadTree import CachedQuadTree
+from ConcurrentQuadTree import ConcurrentQuadTree, ReadWriteLock
+from MortonQuadTree import MortonQuadTree, morton_code
+from MultisetQuadTree import MultisetQuadTree
+from ParallelQuadTree import parallel_from_points, parallel_range_query_many
+from PersistentQuadTree import PersistentQuadTree
 from Point import Point
+from PointLoader import load_points, write_binary_points
 from QuadTree import QuadTree
 
 
@@ -8,6 +40,15 @@ def p(x, y):
     return Point(float(x), float(y))
 
 
+def tree_depth(qt):
+    depth = 0
+    level = [qt] if qt.point else []
+    while level:
+        depth += 1
+        level = [child for node in level for child in node.sons if child]
+    return depth
+
+
 class QuadTreesTest(unittest.TestCase):
     _TOPLEFT = 0
     _TOPRIGHT = 1
@@ -244,6 +285,1198 @@ class QuadTreesTest(unittest.TestCase):
 
         self.assertEqual(str(res_qt), str(qt))
 
+    def test_bulk_load_empty_tree(self):
+        qt = QuadTree.from_points([])
+        self.assertEqual('None: (None, None, None, None)', str(qt))
+
+    def test_bulk_load_picks_median_root(self):
+        qt = QuadTree.from_points([p(0, 0), p(1, 1), p(2, 2)])
+        self.assertEqual(
+            '[1.0, 1.0]: (None, [2.0, 2.0]: (None, None, None, None), None, [0.0, 0.0]: (None, None, None, None))',
+            str(qt))
+
+    def test_bulk_load_accepts_coordinate_pairs_and_drops_duplicates(self):
+        qt = QuadTree.from_points([(2., 2.), (0., 0.), (1., 1.), (2., 2.)])
+        self.assertEqual(
+            '[1.0, 1.0]: (None, [2.0, 2.0]: (None, None, None, None), None, [0.0, 0.0]: (None, None, None, None))',
+            str(qt))
+
+    def test_bulk_load_sorted_input_is_balanced(self):
+        points = [p(i, i) for i in range(1023)]
+        qt = QuadTree.from_points(points)
+        self.assertEqual(10, tree_depth(qt))
+        for point in points:
+            self.assertEqual(point, qt.search(point).point)
+
+    def test_bulk_load_tied_x_columns_is_balanced(self):
+        # Three columns of 1365 points; the plain (x, y) median put most of them in one quadrant (depth 510).
+        points = [p(x, (i * 40503 + x * 12345) % 65521) for x in range(3) for i in range(1365)]
+        qt = QuadTree.from_points(points)
+        self.assertLessEqual(tree_depth(qt), 12)
+        self.assertEqual(str(qt), str(ArrayQuadTree.from_points(points)))
+        for point in points:
+            self.assertEqual(point, qt.search(point).point)
+
+    @unittest.skipIf(np is None, 'numpy is not installed')
+    def test_bulk_load_from_numpy_array(self):
+        qt = QuadTree.from_points(np.array([[2., 2.], [0., 0.], [1., 1.], [2., 2.]]))
+        self.assertEqual(p(1, 1), qt.point)
+        self.assertEqual(2, len(qt.get_all_child_points()))
+        self.assertIs(float, type(qt.point.x))
+        points = [(float(x), float(x * 7 % 13)) for x in range(40)]
+        self.assertEqual(str(QuadTree.from_points(points)), str(QuadTree.from_points(np.array(points))))
+        qt = QuadTree.from_points(np.array([[0., 0., 5.], [1., 1., 6.]]))
+        self.assertEqual(6., qt.search(p(1, 1)).point.payload)
+        self.assertIs(float, type(qt.search(p(1, 1)).point.y))
+
+    def test_range_query_on_empty_tree(self):
+        qt = QuadTree()
+        self.assertEqual([], qt.range_query(0, 0, 10, 10))
+        self.assertEqual(0, qt.count_range_query(0, 0, 10, 10))
+
+    def test_range_query_includes_box_borders(self):
+        qt = QuadTree.from_points([p(x, y) for x in range(5) for y in range(5)])
+        res = qt.range_query(1, 1, 2, 3)
+        self.assertEqual(sorted([(1., 1.), (1., 2.), (1., 3.), (2., 1.), (2., 2.), (2., 3.)]),
+                         sorted((r.x, r.y) for r in res))
+
+    def test_range_query_matches_full_scan(self):
+        qt = QuadTree()
+        for x, y in [(50, 50), (66, 66), (33, 62), (24, 42), (72, 34), (76, 74), (59, 72), (55, 58)]:
+            qt.insert(p(x, y))
+        all_points = [qt.point] + [c.point for c in qt.get_all_child_points()]
+        expected = sorted((a.x, a.y) for a in all_points if 30 <= a.x <= 70 and 40 <= a.y <= 70)
+        self.assertEqual(expected, sorted((r.x, r.y) for r in qt.iter_range_query(30, 40, 70, 70)))
+        self.assertEqual(len(expected), qt.count_range_query(30, 40, 70, 70))
+
+    def test_nearest_on_empty_tree(self):
+        qt = QuadTree()
+        self.assertEqual([], qt.nearest(p(0, 0)))
+
+    def test_nearest_returns_points_by_increasing_distance(self):
+        qt = QuadTree()
+        for x, y in [(50, 50), (66, 66), (33, 62), (24, 42), (72, 34), (76, 74), (59, 72), (55, 58)]:
+            qt.insert(p(x, y))
+        self.assertEqual([p(55, 58)], qt.nearest(p(56, 57)))
+        self.assertEqual([p(55, 58), p(50, 50), p(66, 66)], qt.nearest(p(56, 57), k=3))
+
+    def test_nearest_with_l1_metric(self):
+        qt = QuadTree.from_points([p(0, 0), p(3, 3), p(0, 4.5)])
+        self.assertEqual([p(0, 4.5)], qt.nearest(p(2, 5), metric='l2'))
+        self.assertEqual([p(3, 3)], qt.nearest(p(2.5, 5), metric='l1'))
+
+    def test_nearest_with_custom_metric(self):
+        qt = QuadTree.from_points([p(0, 0), p(3, 1), p(1, 2)])
+        chebyshev = lambda a, b: max(abs(a.x - b.x), abs(a.y - b.y))
+        self.assertEqual([p(1, 2)], qt.nearest(p(2, 2.5), metric=chebyshev))
+
+    def test_within_radius_matches_full_scan(self):
+        qt = QuadTree.from_points([p(x, y) for x in range(10) for y in range(10)])
+        res = qt.within_radius(p(4.5, 4.5), 2)
+        expected = [(x, y) for x in range(10) for y in range(10) if (x - 4.5) ** 2 + (y - 4.5) ** 2 <= 4]
+        self.assertEqual(sorted(expected), sorted((r.x, r.y) for r in res))
+
+    def test_operations_on_tree_deeper_than_recursion_limit(self):
+        points = [p(i, i) for i in range(1500)]
+        qt = QuadTree()
+        for point in points:
+            qt.insert(point)
+        self.assertEqual(1500, tree_depth(qt))
+        self.assertEqual(1499, len(qt.get_all_child_points()))
+        self.assertTrue(str(qt).startswith('[0.0, 0.0]: (None, [1.0, 1.0]: (None, '))
+        self.assertEqual(points[-1], qt.search(points[-1]).point)
+        qt.delete_with_full_reinsertion(points[1000])
+        qt.delete_with_partial_reinsertion(points[500])
+        self.assertIsNone(qt.search(points[1000]))
+        self.assertIsNone(qt.search(points[500]))
+        self.assertEqual(1497, len(qt.get_all_child_points()))
+
+    def test_delete_with_partial_reinserting_reinserts_crosshatched_subtrees_node_by_node(self):
+        qt = QuadTree(p(48, 9))
+        for x, y in [(84, 84), (22, 18), (36, 99), (43, 49)]:
+            qt.insert(p(x, y))
+        qt.delete_with_partial_reinsertion(p(48, 9))
+        self.assertEqual(
+            '[22.0, 18.0]: (None, [84.0, 84.0]: ([36.0, 99.0]: (None, None, None, None), None, None, '
+            '[43.0, 49.0]: (None, None, None, None)), None, None)',
+            str(qt))
+
+    def test_delete_with_partial_reinserting_with_coordinate_ties(self):
+        qt = QuadTree(p(4, 3))
+        qt.insert(p(1, 2))
+        qt.insert(p(3, 2))
+        qt.delete_with_partial_reinsertion(p(4, 3))
+        self.assertEqual(p(1, 2), qt.search(p(1, 2)).point)
+        self.assertEqual(p(3, 2), qt.search(p(3, 2)).point)
+
+    def test_delete_with_partial_reinserting_keeps_every_other_point_reachable(self):
+        # A small grid forces coordinate ties and deep crosshatched subtrees; without lazy deletion involved, every
+        # point that was not deleted must stay reachable by search after each delete.
+        rng = random.Random(11)
+        for _ in range(50):
+            points = list({p(rng.randint(0, 7), rng.randint(0, 7)) for _ in range(25)})
+            qt = QuadTree()
+            for point in points:
+                qt.insert(point)
+            rng.shuffle(points)
+            while points:
+                qt.delete_with_partial_reinsertion(points.pop())
+                self.assertEqual(len(points), len(qt.get_all_child_points()) + bool(qt.point))
+                for point in points:
+                    self.assertEqual(point, qt.search(point).point)
+
+    def test_delete_with_partial_reinserting_candidate_below_the_first_son(self):
+        qt = QuadTree(p(50, 50))
+        for x, y in [(80, 80), (60, 60), (70, 55), (10, 90), (90, 10)]:
+            qt.insert(p(x, y))
+        qt.delete_with_partial_reinsertion(p(50, 50))
+        self.assertEqual(
+            '[60.0, 60.0]: ([10.0, 90.0]: (None, None, None, None), [80.0, 80.0]: (None, None, None, None), '
+            '[90.0, 10.0]: ([70.0, 55.0]: (None, None, None, None), None, None, None), None)',
+            str(qt))
+
+    def test_delete_lazy_keeps_node_as_split(self):
+        qt = QuadTree.from_points([p(0, 0), p(1, 1), p(2, 2)])
+        qt.lazy_rebuild_threshold = 1.
+        qt.delete_lazy(p(1, 1))
+        self.assertEqual(
+            '[1.0, 1.0]: (None, [2.0, 2.0]: (None, None, None, None), None, [0.0, 0.0]: (None, None, None, None))',
+            str(qt))
+        self.assertIsNone(qt.search(p(1, 1)))
+        self.assertEqual([p(0, 0), p(2, 2)], sorted(qt.range_query(-1, -1, 3, 3), key=lambda r: r.x))
+        self.assertEqual([p(2, 2)], qt.nearest(p(1.1, 1.1)))
+
+    def test_delete_lazy_then_insert_revives_node(self):
+        qt = QuadTree.from_points([p(0, 0), p(1, 1), p(2, 2)])
+        qt.lazy_rebuild_threshold = 1.
+        qt.delete_lazy(p(1, 1))
+        qt.insert(Point(1., 1., 'again'))
+        self.assertEqual('again', qt.search(p(1, 1)).point.payload)
+        self.assertEqual(0, qt._deleted_count)
+
+    def test_delete_lazy_rebuilds_past_threshold(self):
+        qt = QuadTree()
+        for i in range(10):
+            qt.insert(p(i, i))
+        qt.lazy_rebuild_threshold = 0.3
+        for i in range(3):
+            qt.delete_lazy(p(i, i))
+        self.assertEqual(10, 1 + len(qt.get_all_child_points()))
+        qt.delete_lazy(p(3, 3))
+        self.assertEqual(6, 1 + len(qt.get_all_child_points()))
+        self.assertEqual(0, qt._deleted_count)
+        self.assertEqual(3, tree_depth(qt))
+
+    def test_physical_delete_after_lazy_delete(self):
+        qt = QuadTree.from_points([p(x, y) for x in range(3) for y in range(3)])
+        qt.lazy_rebuild_threshold = 1.
+        qt.delete_lazy(p(1, 1))
+        qt.delete_with_partial_reinsertion(p(1, 1))
+        qt.delete_with_full_reinsertion(p(0, 2))
+        self.assertEqual(0, qt._deleted_count)
+        self.assertEqual(7, qt.count_range_query(0, 0, 2, 2))
+
+    def test_root_keeps_node_count(self):
+        qt = QuadTree.from_points([p(x, y) for x in range(3) for y in range(3)])
+        self.assertEqual(9, qt._known_size)
+        qt.insert(p(5, 5))
+        qt.insert(p(5, 5))
+        qt.delete_lazy(p(0, 0))
+        qt.insert(p(0, 0))
+        self.assertEqual(10, qt._known_size)
+        qt.delete_with_partial_reinsertion(p(1, 1))
+        qt.delete_with_full_reinsertion(p(2, 2))
+        self.assertEqual(8, qt._known_size)
+        self.assertEqual(8, qt.clone()._known_size)
+        self.assertEqual(qt._node_count(), qt._known_size)
+
+    def test_compact_empty_tree(self):
+        qt = QuadTree.from_points([p(0, 0), p(1, 1)])
+        qt.delete_with_partial_reinsertion(p(0, 0))
+        qt.delete_with_partial_reinsertion(p(1, 1))
+        qt.compact()
+        self.assertEqual(0, qt._known_size)
+        bqt = BalancedQuadTree.from_points([p(i, i) for i in range(8)])
+        for i in range(8):
+            bqt.delete_with_partial_reinsertion(p(i, i))
+        self.assertEqual(0, bqt._known_size)
+
+    def test_cached_candidates_follow_updates(self):
+        qt = QuadTree.from_points([p(x, x * 7 % 13) for x in range(40)])
+        for x in range(40, 70):
+            qt.insert(p(x % 17 + .5, x % 11 + .5))
+        for x in range(0, 40, 3):
+            qt.delete_with_partial_reinsertion(p(x, x * 7 % 13))
+        qt.delete_with_full_reinsertion(p(1, 7))
+        for tree in (qt, qt.clone()):
+            for node in [tree] + tree.get_all_child_points():
+                for quadrant in QuadTree._POINT_DIRECTIONS:
+                    candidate = node
+                    while candidate.sons[QuadTree._conjugate(quadrant)]:
+                        candidate = candidate.sons[QuadTree._conjugate(quadrant)]
+                    self.assertIs(candidate, node.find_candidate(quadrant))
+
+    def test_clone_copies_structure(self):
+        qt = QuadTree.from_points([p(x, y) for x in range(4) for y in range(4)])
+        qt_clone = qt.clone()
+        self.assertEqual(str(qt), str(qt_clone))
+        qt_clone.delete_with_partial_reinsertion(qt.point)
+        qt_clone.insert(p(10, 10))
+        self.assertNotEqual(str(qt), str(qt_clone))
+        self.assertEqual(16, 1 + len(qt.get_all_child_points()))
+        self.assertIsNone(qt.search(p(10, 10)))
+
+    def test_clone_shares_points_unless_asked_not_to(self):
+        qt = QuadTree.from_points([Point(1., 1., 'a'), Point(2., 2., 'b')])
+        self.assertIs(qt.point, qt.clone().point)
+        self.assertIsNot(qt.point, qt.clone(share_points=False).point)
+        self.assertEqual('a', qt.clone(share_points=False).search(p(1, 1)).point.payload)
+
+    def test_copy_hooks_use_clone(self):
+        qt = QuadTree.from_points([p(0, 0), p(1, 1), p(2, 2)])
+        for qt_copy in (copy.copy(qt), copy.deepcopy(qt)):
+            self.assertEqual(str(qt), str(qt_copy))
+            self.assertIsNot(qt.sons[1], qt_copy.sons[1])
+
+    def test_deepcopy_copies_payloads(self):
+        payload = {'tags': ['a']}
+        qt = MultisetQuadTree.from_points([Point(0, 0), Point(1, 1, payload), Point(1, 1, 'b'), Point(2, 2)])
+        self.assertIs(payload, copy.copy(qt).search(p(1, 1)).point.payload)
+        node = copy.deepcopy(qt).search(p(1, 1))
+        self.assertEqual(payload, node.point.payload)
+        self.assertIsNot(payload, node.point.payload)
+        self.assertIs(node.point.payload, node.payloads[0])
+        self.assertEqual([node.point.payload, 'b'], node.payloads)
+        self.assertEqual(str(qt), str(copy.deepcopy(qt)))
+
+
+class ArrayQuadTreesTest(unittest.TestCase):
+    _PAPER_POINTS = [(50, 50), (66, 66), (33, 62), (24, 42), (72, 34), (76, 74), (59, 72), (55, 58), (86, 52),
+                     (22, 68), (29, 56), (62, 62), (53, 64), (61, 54)]
+
+    def test_build_empty_tree(self):
+        aqt = ArrayQuadTree()
+        self.assertEqual('None: (None, None, None, None)', str(aqt))
+        self.assertEqual(0, len(aqt))
+        self.assertIsNone(aqt.search(p(0, 0)))
+
+    def test_insert_builds_same_shape_as_quadtree(self):
+        qt = QuadTree()
+        aqt = ArrayQuadTree()
+        for x, y in self._PAPER_POINTS:
+            qt.insert(p(x, y))
+            aqt.insert(p(x, y))
+        aqt.insert(p(50, 50))
+        self.assertEqual(str(qt), str(aqt))
+        self.assertEqual(len(self._PAPER_POINTS), len(aqt))
+
+    def test_search(self):
+        aqt = ArrayQuadTree.from_points([p(x, y) for x, y in self._PAPER_POINTS])
+        self.assertEqual(p(59, 72), aqt.search(p(59, 72)))
+        self.assertIsNone(aqt.search(p(59, 71)))
+
+    def test_bulk_load_builds_same_shape_as_quadtree(self):
+        points = [p(x, y) for x, y in self._PAPER_POINTS]
+        self.assertEqual(str(QuadTree.from_points(points)), str(ArrayQuadTree.from_points(points)))
+        self.assertEqual(str(QuadTree.from_points(points)),
+                         str(ArrayQuadTree.from_quadtree(QuadTree.from_points(points))))
+
+    def test_bulk_load_of_large_inputs_with_and_without_numpy(self):
+        points = [p((i * 37) % 101, (i * 53) % 97 // 4) for i in range(3000)]
+        expected = str(QuadTree.from_points(points))
+        self.assertEqual(expected, str(ArrayQuadTree.from_points(points)))
+        if np is not None:
+            coordinates = np.array([(a.x, a.y) for a in points])
+            self.assertEqual(expected, str(ArrayQuadTree.from_points(coordinates)))
+        with mock.patch.object(array_quadtree, 'np', None), mock.patch.object(quadtree_helpers, 'np', None):
+            self.assertEqual(expected, str(ArrayQuadTree.from_points(points)))
+
+    def test_delete_with_full_reinsertion_matches_quadtree(self):
+        qt = QuadTree()
+        aqt = ArrayQuadTree()
+        for x, y in self._PAPER_POINTS:
+            qt.insert(p(x, y))
+            aqt.insert(p(x, y))
+        for x, y in [(66, 66), (50, 50), (24, 42), (10, 10)]:
+            qt.delete_with_full_reinsertion(p(x, y))
+            aqt.delete_with_full_reinsertion(p(x, y))
+            self.assertEqual(str(qt), str(aqt))
+        self.assertEqual(len(self._PAPER_POINTS) - 3, len(aqt))
+
+    def test_delete_with_partial_reinsertion_matches_quadtree(self):
+        points = [p(x, y) for x, y in self._PAPER_POINTS] + [p(x % 7, x * 3 % 11) for x in range(40)]
+        qt = QuadTree()
+        aqt = ArrayQuadTree()
+        for point in points:
+            qt.insert(point)
+            aqt.insert(point)
+        for point in points[::3] + [p(200, 200)]:
+            qt.delete_with_partial_reinsertion(point)
+            aqt.delete_with_partial_reinsertion(point)
+            self.assertEqual(str(qt), str(aqt))
+        self.assertEqual(1 + len(qt.get_all_child_points()), len(aqt))
+
+    def test_delete_reuses_free_slots(self):
+        aqt = ArrayQuadTree()
+        for x, y in self._PAPER_POINTS:
+            aqt.insert(p(x, y))
+        aqt.delete_with_full_reinsertion(p(72, 34))
+        aqt.insert(p(1, 1))
+        self.assertEqual(len(self._PAPER_POINTS), len(aqt._xs))
+
+    def test_delete_last_point(self):
+        aqt = ArrayQuadTree()
+        aqt.insert(p(0, 0))
+        aqt.delete_with_full_reinsertion(p(0, 0))
+        self.assertEqual('None: (None, None, None, None)', str(aqt))
+        self.assertEqual(0, len(aqt))
+
+    def test_range_query(self):
+        aqt = ArrayQuadTree.from_points([p(x, y) for x, y in self._PAPER_POINTS])
+        expected = sorted((x, y) for x, y in self._PAPER_POINTS if 30 <= x <= 70 and 40 <= y <= 70)
+        self.assertEqual(expected, sorted((r.x, r.y) for r in aqt.range_query(30, 40, 70, 70)))
+        self.assertEqual(len(expected), aqt.count_range_query(30, 40, 70, 70))
+
+
+class PointsTest(unittest.TestCase):
+
+    def test_points_are_hashable_by_coordinates(self):
+        self.assertEqual(1, len({p(1, 2), p(1, 2), Point(1., 2., 'payload')}))
+        self.assertEqual(hash(p(1, 2)), hash(Point(1., 2., 'payload')))
+
+    def test_equality_ignores_payload(self):
+        self.assertEqual(Point(1., 2., 'a'), Point(1., 2., 'b'))
+        self.assertNotEqual(p(1, 2), p(2, 1))
+        self.assertNotEqual(p(1, 2), (1., 2.))
+
+    def test_points_are_immutable(self):
+        point = p(1, 2)
+        with self.assertRaises(AttributeError):
+            point.x = 3.
+        with self.assertRaises(AttributeError):
+            point.z = 3.
+
+    def test_copies_and_pickles_keep_payload(self):
+        point = Point(1., 2., {'id': 7})
+        self.assertIs(point, copy.copy(point))
+        self.assertEqual(point, copy.deepcopy(point))
+        self.assertEqual({'id': 7}, copy.deepcopy(point).payload)
+        self.assertIsNot(point.payload, copy.deepcopy(point).payload)
+        immutable = Point(1., 2., 'id')
+        self.assertIs(immutable, copy.deepcopy(immutable))
+        unpickled = pickle.loads(pickle.dumps(point))
+        self.assertEqual(point, unpickled)
+        self.assertEqual({'id': 7}, unpickled.payload)
+
+    def test_quadtree_stores_payloads(self):
+        qt = QuadTree.from_points([(0., 0., 'depot'), (1., 1., 'vehicle')])
+        qt.insert(Point(2., 2., 'station'))
+        self.assertEqual('vehicle', qt.search(p(1, 1)).point.payload)
+        self.assertEqual('station', qt.search(p(2, 2)).point.payload)
+        self.assertEqual(['depot'], [r.payload for r in qt.range_query(-1, -1, 0.5, 0.5)])
+
+
+@unittest.skipIf(np is None, 'numpy is not installed')
+class BatchQuadTreesTest(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(24011994)
+        self.coordinates = np.round(rng.uniform(0., 100., size=(300, 2)), 1)
+        self.qt = QuadTree()
+        for x, y in self.coordinates:
+            self.qt.insert(p(x, y))
+        self.batch = BatchQuadTree(self.qt)
+
+    def test_empty_tree(self):
+        batch = BatchQuadTree(QuadTree())
+        self.assertEqual([-1], batch.search_many([0.], [0.]).tolist())
+        self.assertEqual(0, batch.range_query_many([[0., 0., 1., 1.]])[0].size)
+        indices, distances = batch.nearest_many([0.], [0.], k=2)
+        self.assertEqual([[-1, -1]], indices.tolist())
+
+    def test_search_many(self):
+        xs = np.append(self.coordinates[:50, 0], [-1., 50.05])
+        ys = np.append(self.coordinates[:50, 1], [-1., 50.05])
+        found = self.batch.search_many(xs, ys)
+        self.assertEqual([-1, -1], found[-2:].tolist())
+        for idx, x, y in zip(found[:-2], xs, ys):
+            self.assertEqual(p(x, y), self.batch.points[idx])
+
+    def test_range_query_many(self):
+        boxes = [[10., 10., 40., 60.], [0., 0., 100., 100.], [200., 200., 300., 300.], [50., 0., 50., 100.]]
+        results = self.batch.range_query_many(boxes)
+        for box, indices in zip(boxes, results):
+            expected = sorted((r.x, r.y) for r in self.qt.range_query(*box))
+            self.assertEqual(expected, sorted((self.batch.points[i].x, self.batch.points[i].y) for i in indices))
+
+    def test_nearest_many(self):
+        rng = np.random.default_rng(7)
+        queries = rng.uniform(-10., 110., size=(40, 2))
+        for metric in ('l2', 'l1'):
+            indices, distances = self.batch.nearest_many(queries[:, 0], queries[:, 1], k=4, metric=metric)
+            for (x, y), row, row_distances in zip(queries, indices, distances):
+                expected = self.qt.nearest(p(x, y), k=4, metric=metric)
+                compute = QuadTree._METRICS[metric]
+                self.assertEqual([round(compute(e, p(x, y)), 9) for e in expected],
+                                 [round(d, 9) for d in row_distances])
+                self.assertEqual([round(compute(e, p(x, y)), 9) for e in expected],
+                                 [round(compute(self.batch.points[i], p(x, y)), 9) for i in row])
+
+    def test_empty_batches(self):
+        self.assertEqual([], self.batch.range_query_many(np.empty((0, 4))))
+        self.assertEqual([], self.batch.range_query_many([]))
+        indices, distances = self.batch.nearest_many([0., 1.], [0., 1.], k=0)
+        self.assertEqual((2, 0), indices.shape)
+        self.assertEqual((2, 0), distances.shape)
+        self.assertEqual([], self.qt.nearest(p(0, 0), k=0))
+
+    def test_nearest_many_rejects_unknown_metrics(self):
+        self.assertEqual(set(QuadTree._METRICS), set(BatchQuadTree._METRICS))
+        for metric in ('linf', QuadTree._METRICS['l2']):
+            with self.assertRaises(ValueError):
+                self.batch.nearest_many([0.], [0.], metric=metric)
+
+
+class ParallelQuadTreesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.points = [p((i * 37) % 101, (i * 53) % 97) for i in range(2000)]
+
+    def test_parallel_bulk_load_builds_same_tree_as_bulk_load(self):
+        self.assertEqual(str(QuadTree.from_points(self.points)), str(parallel_from_points(self.points, workers=2)))
+
+    def test_parallel_bulk_load_of_small_inputs(self):
+        self.assertEqual('None: (None, None, None, None)', str(parallel_from_points([], workers=2)))
+        self.assertEqual('[1.0, 1.0]: (None, None, None, None)', str(parallel_from_points([p(1, 1)], workers=2)))
+
+    def test_parallel_bulk_load_into_shared_buffers_builds_same_tree_as_bulk_load(self):
+        aqt = parallel_from_points(self.points, workers=2, tree_class=ArrayQuadTree)
+        self.assertEqual(str(ArrayQuadTree.from_points(self.points)), str(aqt))
+        self.assertEqual(len(ArrayQuadTree.from_points(self.points)), len(aqt))
+        self.assertEqual('None: (None, None, None, None)', str(parallel_from_points([], 2, ArrayQuadTree)))
+        aqt.insert(p(0.5, 0.5))
+        self.assertIsNotNone(aqt.search(p(0.5, 0.5)))
+
+    def test_parallel_bulk_load_of_subclasses_matches_their_bulk_load(self):
+        records = self.points + [Point(x, y, 'again') for x, y in ArrayQuadTreesTest._PAPER_POINTS]
+        mqt = parallel_from_points(records, workers=2, tree_class=MultisetQuadTree)
+        self.assertIsInstance(mqt, MultisetQuadTree)
+        self.assertEqual(len(records), len(mqt.range_query_records(-1, -1, 101, 101)))
+        self.assertEqual(MultisetQuadTree.from_points(records).payloads_at(p(61, 54)), mqt.payloads_at(p(61, 54)))
+
+        bqt = parallel_from_points(self.points, workers=2, tree_class=BalancedQuadTree)
+        self.assertEqual(str(BalancedQuadTree.from_points(self.points)), str(bqt))
+        self.assertEqual(BalancedQuadTree.from_points(self.points)._known_size, bqt._known_size)
+        self.assertEqual(bqt._known_size, bqt._max_size)
+        for i in range(50):
+            bqt.insert(p(i / 64, i / 64))
+        self.assertLessEqual(tree_depth(bqt), bqt._height_limit())
+
+        aqt = parallel_from_points(self.points, workers=2, tree_class=AugmentedQuadTree)
+        expected = AugmentedQuadTree.from_points(self.points)
+        self.assertEqual(str(expected), str(aqt))
+        self.assertEqual((expected.size, expected.bbox), (aqt.size, aqt.bbox))
+        self.assertEqual(expected.count_range_query(10, 10, 30, 40), aqt.count_range_query(10, 10, 30, 40))
+
+    def test_parallel_bulk_load_rejects_classes_it_cannot_build(self):
+        class SortedQuadTree(QuadTree):
+            @classmethod
+            def from_points(cls, points):
+                return super().from_points(sorted(points, key=lambda pt: pt.y))
+
+        for tree_class in (SortedQuadTree, BucketQuadTree, PersistentQuadTree):
+            with self.assertRaises(TypeError):
+                parallel_from_points(self.points, workers=2, tree_class=tree_class)
+
+    def test_parallel_range_query_many_matches_range_query(self):
+        qt = QuadTree.from_points(self.points)
+        boxes = [(10, 10, 30, 40), (0, 0, 100, 100), (200, 200, 300, 300), (50, 0, 50, 96)]
+        results = parallel_range_query_many(qt, boxes, workers=2)
+        for box, res in zip(boxes, results):
+            self.assertEqual(sorted((r.x, r.y) for r in qt.range_query(*box)), sorted((r.x, r.y) for r in res))
+
+    def test_parallel_range_query_many_on_empty_tree(self):
+        self.assertEqual([[]], parallel_range_query_many(QuadTree(), [(0, 0, 1, 1)], workers=2))
+
+
+class SerializationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.qt = QuadTree()
+        for x, y in ArrayQuadTreesTest._PAPER_POINTS:
+            self.qt.insert(p(x, y))
+        handle, self.path = tempfile.mkstemp(suffix='.qtree')
+        os.close(handle)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_save_and_load_keeps_tree_shape(self):
+        self.qt.save(self.path)
+        self.assertEqual(str(self.qt), str(QuadTree.load(self.path)))
+
+    def test_save_and_load_empty_tree(self):
+        QuadTree().save(self.path)
+        self.assertEqual('None: (None, None, None, None)', str(QuadTree.load(self.path)))
+        with QuadTree.load(self.path, mmap=True) as mapped:
+            self.assertEqual(0, len(mapped))
+            self.assertIsNone(mapped.search(p(0, 0)))
+            self.assertEqual([], mapped.range_query(0, 0, 1, 1))
+
+    def test_mapped_tree_answers_queries(self):
+        self.qt.save(self.path)
+        with QuadTree.load(self.path, mmap=True) as mapped:
+            self.assertEqual(len(ArrayQuadTreesTest._PAPER_POINTS), len(mapped))
+            self.assertEqual(p(61, 54), mapped.search(p(61, 54)))
+            self.assertIsNone(mapped.search(p(61, 55)))
+            self.assertEqual(sorted((r.x, r.y) for r in self.qt.range_query(30, 40, 70, 70)),
+                             sorted((r.x, r.y) for r in mapped.range_query(30, 40, 70, 70)))
+            self.assertEqual(self.qt.count_range_query(30, 40, 70, 70), mapped.count_range_query(30, 40, 70, 70))
+
+    def test_load_rejects_other_files(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'not a quadtree file')
+        with self.assertRaises(ValueError):
+            QuadTree.load(self.path)
+
+
+class AugmentedQuadTreesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.qt = AugmentedQuadTree()
+        for x, y in ArrayQuadTreesTest._PAPER_POINTS:
+            self.qt.insert(p(x, y))
+
+    def assert_augmentation(self, qt):
+        for node in [qt] + qt.get_all_child_points():
+            live = [n.point for n in [node] + node.get_all_child_points() if n.point and not n._deleted]
+            self.assertEqual(len(live), node.size)
+            if live:
+                self.assertEqual((min(a.x for a in live), min(a.y for a in live),
+                                  max(a.x for a in live), max(a.y for a in live)), node.bbox)
+            else:
+                self.assertIsNone(node.bbox)
+
+    def test_empty_tree(self):
+        qt = AugmentedQuadTree()
+        self.assertEqual(0, qt.size)
+        self.assertIsNone(qt.bbox)
+        self.assertEqual(0, qt.count_range_query(0, 0, 10, 10))
+
+    def test_insert_keeps_subtree_sizes_and_boxes(self):
+        self.assertEqual(len(ArrayQuadTreesTest._PAPER_POINTS), self.qt.size)
+        self.qt.insert(p(61, 54))
+        self.assertEqual(len(ArrayQuadTreesTest._PAPER_POINTS), self.qt.size)
+        self.assert_augmentation(self.qt)
+        self.assert_augmentation(AugmentedQuadTree.from_points(ArrayQuadTreesTest._PAPER_POINTS))
+
+    def test_deletes_keep_subtree_sizes_and_boxes(self):
+        self.qt.delete_with_partial_reinsertion(p(61, 54))
+        self.assert_augmentation(self.qt)
+        self.qt.delete_with_full_reinsertion(p(50, 50))
+        self.assert_augmentation(self.qt)
+        self.qt.delete_lazy(p(24, 42))
+        self.assert_augmentation(self.qt)
+        self.qt.insert(p(24, 42))
+        self.assert_augmentation(self.qt)
+        self.assertEqual(len(ArrayQuadTreesTest._PAPER_POINTS) - 2, self.qt.size)
+
+    def test_partial_reinsertion_of_root_keeps_subtree_sizes_and_boxes(self):
+        qt = AugmentedQuadTree(p(48, 9))
+        for x, y in [(84, 84), (22, 18), (36, 99), (43, 49)]:
+            qt.insert(p(x, y))
+        qt.delete_with_partial_reinsertion(p(48, 9))
+        self.assertEqual(4, qt.size)
+        self.assert_augmentation(qt)
+        self.qt.delete_with_partial_reinsertion(self.qt.point)
+        self.assert_augmentation(self.qt)
+
+    def test_queries_match_plain_quadtree(self):
+        plain = QuadTree()
+        for x, y in ArrayQuadTreesTest._PAPER_POINTS:
+            plain.insert(p(x, y))
+        self.qt.delete_lazy(p(61, 54))
+        plain.delete_lazy(p(61, 54))
+        for box in [(30, 40, 70, 70), (0, 0, 100, 100), (60, 50, 62, 55), (200, 200, 300, 300)]:
+            self.assertEqual(plain.count_range_query(*box), self.qt.count_range_query(*box))
+        self.assertEqual(plain.nearest(p(60, 52), k=4), self.qt.nearest(p(60, 52), k=4))
+        self.assertEqual(plain.within_radius(p(40, 40), 25), self.qt.within_radius(p(40, 40), 25))
+
+
+class BucketQuadTreesTest(unittest.TestCase):
+
+    def test_leaves_split_only_when_full(self):
+        bqt = BucketQuadTree(bucket_size=4)
+        for x, y in [(1, 1), (2, 2), (3, 3), (4, 4)]:
+            bqt.insert(p(x, y))
+        self.assertIsNone(bqt.sons)
+        bqt.insert(p(5, 5))
+        self.assertIsNone(bqt.points)
+        self.assertEqual(5, bqt.size)
+        self.assertTrue(all(son is None or son.size <= 4 for son in bqt.sons))
+
+    def test_insert_search_and_drop_duplicates(self):
+        bqt = BucketQuadTree.from_points([(x, y) for x, y in ArrayQuadTreesTest._PAPER_POINTS], bucket_size=2)
+        bqt.insert(p(61, 54))
+        self.assertEqual(len(ArrayQuadTreesTest._PAPER_POINTS), bqt.size)
+        for x, y in ArrayQuadTreesTest._PAPER_POINTS:
+            self.assertEqual(p(x, y), bqt.search(p(x, y)))
+        self.assertIsNone(bqt.search(p(61, 55)))
+
+    def test_split_with_coordinate_ties(self):
+        bqt = BucketQuadTree(bucket_size=2)
+        for y in range(50):
+            bqt.insert(p(0, y))
+        self.assertEqual(50, bqt.size)
+        self.assertEqual([p(0, y) for y in range(50)], sorted(bqt.get_all_points(), key=lambda a: a.y))
+
+    def test_delete_merges_underfull_subtrees(self):
+        bqt = BucketQuadTree.from_points([p(x, y) for x in range(10) for y in range(10)], bucket_size=4)
+        for x in range(10):
+            for y in range(10):
+                if (x, y) != (3, 3):
+                    bqt.delete(p(x, y))
+        self.assertIsNone(bqt.sons)
+        self.assertEqual([p(3, 3)], bqt.points)
+        bqt.delete_with_partial_reinsertion(p(3, 3))
+        self.assertEqual(0, bqt.size)
+        self.assertIsNone(bqt.search(p(3, 3)))
+
+    def test_delete_merges_only_below_half_a_bucket(self):
+        bqt = BucketQuadTree.from_points([p(x, 0) for x in range(5)], bucket_size=4)
+        for _ in range(3):
+            bqt.delete(p(4, 0))
+            self.assertIsNotNone(bqt.sons)
+            bqt.insert(p(4, 0))
+        for x in (4, 3):
+            bqt.delete(p(x, 0))
+        self.assertIsNotNone(bqt.sons)
+        bqt.delete(p(2, 0))
+        self.assertIsNone(bqt.sons)
+        self.assertEqual([p(0, 0), p(1, 0)], sorted(bqt.points, key=lambda a: a.x))
+
+    def test_range_query_matches_quadtree(self):
+        points = [p((i * 37) % 101, (i * 53) % 97) for i in range(500)]
+        bqt = BucketQuadTree.from_points(points, bucket_size=16)
+        qt = QuadTree.from_points(points)
+        for box in [(10, 10, 30, 40), (0, 0, 100, 100), (50, 0, 50, 96)]:
+            self.assertEqual(sorted((r.x, r.y) for r in qt.range_query(*box)),
+                             sorted((r.x, r.y) for r in bqt.range_query(*box)))
+            self.assertEqual(qt.count_range_query(*box), bqt.count_range_query(*box))
+
+
+class BalancedQuadTreesTest(unittest.TestCase):
+
+    def test_sorted_inserts_keep_depth_logarithmic(self):
+        bqt = BalancedQuadTree()
+        for i in range(2000):
+            bqt.insert(p(i, i))
+        self.assertEqual(2000, bqt._known_size)
+        self.assertLessEqual(tree_depth(bqt), bqt._height_limit())
+        for i in range(2000):
+            self.assertEqual(p(i, i), bqt.search(p(i, i)).point)
+
+    def test_insert_existing_point_does_not_grow_tree(self):
+        bqt = BalancedQuadTree.from_points(ArrayQuadTreesTest._PAPER_POINTS)
+        bqt.insert(p(61, 54))
+        self.assertEqual(len(ArrayQuadTreesTest._PAPER_POINTS), bqt._known_size)
+
+    def test_every_build_sets_the_sizes(self):
+        points = [p(i, i * 7 % 13) for i in range(50)]
+        bqt = BalancedQuadTree.from_points(points)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'tree.qt')
+            bqt.save(path)
+            trees = [bqt, bqt.clone(), BalancedQuadTree.load(path)]
+        for tree in trees:
+            self.assertEqual(50, tree._known_size)
+            self.assertEqual(50, tree._max_size)
+            tree.insert(p(.5, .5))
+            self.assertEqual(51, tree._max_size)
+
+    def test_deletes_rebuild_once_tree_shrinks(self):
+        bqt = BalancedQuadTree()
+        for i in range(100):
+            bqt.insert(p(i, i))
+        for i in range(0, 100, 2):
+            bqt.delete_with_partial_reinsertion(p(i, i))
+        for i in range(1, 60, 2):
+            bqt.delete_lazy(p(i, i))
+        self.assertEqual(bqt._known_size, 1 + len(bqt.get_all_child_points()))
+        self.assertLessEqual(bqt._known_size, bqt._max_size)
+        self.assertEqual(sorted(float(i) for i in range(61, 100, 2)),
+                         sorted(a.x for a in bqt.range_query(0, 0, 100, 100)))
+
+
+class ConcurrentQuadTreesTest(unittest.TestCase):
+
+    def test_writer_waits_for_readers(self):
+        lock = ReadWriteLock()
+        events = []
+        lock.acquire_read()
+        writer = threading.Thread(target=lambda: (lock.acquire_write(), events.append('write'), lock.release_write()))
+        writer.start()
+        writer.join(0.05)
+        events.append('read')
+        lock.release_read()
+        writer.join()
+        self.assertEqual(['read', 'write'], events)
+
+    def test_concurrent_updates_and_queries(self):
+        # Stable and volatile points are interleaved, so deleting the volatile ones keeps moving stable nodes
+        # around; a short switch interval makes the threads interleave inside those deletes.
+        coordinates = sorted({(i * 37 % 301, i * 53 % 307) for i in range(600)},
+                             key=lambda xy: (xy[0] * 7 + xy[1]) % 11)
+        stable = [p(x, y) for x, y in coordinates[::2]]
+        volatile = [p(x, y) for x, y in coordinates[1::2]]
+        cqt = ConcurrentQuadTree()
+        for stable_point, volatile_point in zip(stable, volatile):
+            cqt.insert(stable_point)
+            cqt.insert(volatile_point)
+        errors = []
+        writing = threading.Event()
+        writing.set()
+
+        def writer(points):
+            for _ in range(5):
+                for pt in points:
+                    cqt.delete_with_partial_reinsertion(pt)
+                for pt in points:
+                    cqt.insert(pt)
+
+        def reader():
+            while writing.is_set():
+                for pt in stable:
+                    if cqt.search(pt) != pt:
+                        errors.append(pt)
+                if cqt.count_range_query(0, 0, 400, 400) < len(stable):
+                    errors.append('count')
+
+        switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-5)
+        try:
+            writers = [threading.Thread(target=writer, args=(volatile[i::2],)) for i in range(2)]
+            readers = [threading.Thread(target=reader) for _ in range(3)]
+            for thread in writers + readers:
+                thread.start()
+            for thread in writers:
+                thread.join()
+            writing.clear()
+            for thread in readers:
+                thread.join()
+        finally:
+            sys.setswitchinterval(switch_interval)
+        self.assertEqual([], errors)
+        self.assertEqual(sorted((a.x, a.y) for a in stable + volatile),
+                         sorted((a.x, a.y) for a in cqt.range_query(0, 0, 400, 400)))
+
+
+class PersistentQuadTreesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.versions = [PersistentQuadTree()]
+        for x, y in ArrayQuadTreesTest._PAPER_POINTS:
+            self.versions.append(self.versions[-1].insert(p(x, y)))
+
+    def test_insert_builds_same_shape_as_quadtree(self):
+        qt = QuadTree()
+        for x, y in ArrayQuadTreesTest._PAPER_POINTS:
+            qt.insert(p(x, y))
+        self.assertEqual(str(qt), str(self.versions[-1]))
+        self.assertEqual('None: (None, None, None, None)', str(self.versions[0]))
+
+    def test_old_versions_are_kept(self):
+        for idx, version in enumerate(self.versions):
+            self.assertEqual(idx, version.count_range_query(0, 0, 100, 100))
+        self.assertIsNone(self.versions[3].search(p(24, 42)))
+        self.assertEqual(p(24, 42), self.versions[4].search(p(24, 42)).point)
+
+    def test_updates_share_untouched_subtrees(self):
+        tree = self.versions[-1]
+        new_tree = tree.insert(p(90, 10))
+        self.assertIsNot(tree, new_tree)
+        self.assertIs(tree.sons[QuadTreesTest._TOPLEFT], new_tree.sons[QuadTreesTest._TOPLEFT])
+        self.assertIs(tree.sons[QuadTreesTest._TOPRIGHT], new_tree.sons[QuadTreesTest._TOPRIGHT])
+        self.assertIs(tree, tree.insert(p(61, 54)))
+        self.assertIs(tree, tree.delete(p(61, 55)))
+
+    def test_delete_returns_new_version(self):
+        tree = self.versions[-1]
+        new_tree = tree.delete(p(66, 66))
+        self.assertIsNone(new_tree.search(p(66, 66)))
+        self.assertIsNotNone(tree.search(p(66, 66)))
+        self.assertIs(tree.sons[QuadTreesTest._BOTTOMLEFT], new_tree.sons[QuadTreesTest._BOTTOMLEFT])
+        remaining = [(float(x), float(y)) for x, y in ArrayQuadTreesTest._PAPER_POINTS if (x, y) != (66, 66)]
+        self.assertEqual(sorted(remaining),
+                         sorted((a.x, a.y) for a in new_tree.range_query(0, 0, 100, 100)))
+        self.assertEqual('None: (None, None, None, None)', str(self.versions[1].delete(p(50, 50))))
+
+    def test_delete_of_leaf_or_single_son_node_only_copies_the_path(self):
+        tree = PersistentQuadTree.from_points([p(1, 1), p(2, 2), p(3, 3), p(0, 3), p(4, 4)])
+        node = tree.search(p(4, 4))
+        self.assertEqual([None, None, None], [son for son in node.sons if son is not node.sons[3]])
+        new_tree = tree.delete(p(4, 4))
+        self.assertIs(node.sons[QuadTreesTest._BOTTOMLEFT], new_tree.sons[QuadTreesTest._TOPRIGHT])
+        self.assertEqual([p(0, 3), p(1, 1), p(2, 2), p(3, 3)], sorted(new_tree.get_all_points(), key=lambda a: a.x))
+        self.assertIs(tree.sons[QuadTreesTest._TOPRIGHT], tree.delete(p(0, 3)).sons[QuadTreesTest._TOPRIGHT])
+        self.assertIsNone(tree.delete(p(0, 3)).sons[QuadTreesTest._TOPLEFT])
+
+    def test_nodes_are_immutable(self):
+        with self.assertRaises(AttributeError):
+            self.versions[-1].point = p(0, 0)
+
+
+class AsyncQuadTreesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.qt = QuadTree.from_points([p((i * 37) % 101, (i * 53) % 97) for i in range(2000)])
+
+    def test_async_scans_match_sync_scans(self):
+        async def scans():
+            all_points = [a async for a in async_quadtree.iter_all_points(self.qt, yield_every=16)]
+            in_box = await async_quadtree.range_query(self.qt, 10, 10, 30, 40, yield_every=16)
+            closest = await async_quadtree.nearest(self.qt, p(50.5, 50.5), k=5, yield_every=16)
+            return all_points, in_box, closest
+
+        all_points, in_box, closest = asyncio.run(scans())
+        self.assertEqual(sorted((c.point.x, c.point.y) for c in [self.qt] + self.qt.get_all_child_points()),
+                         sorted((a.x, a.y) for a in all_points))
+        self.assertEqual(self.qt.range_query(10, 10, 30, 40), in_box)
+        self.assertEqual(self.qt.nearest(p(50.5, 50.5), k=5), closest)
+
+    def test_scans_skip_lazily_deleted_points(self):
+        self.qt.delete_lazy(self.qt.point)
+
+        async def scans():
+            return ([a async for a in async_quadtree.iter_all_points(self.qt)],
+                    await async_quadtree.nearest(self.qt, self.qt.point))
+
+        all_points, closest = asyncio.run(scans())
+        self.assertNotIn(self.qt.point, all_points)
+        self.assertNotEqual([self.qt.point], closest)
+
+    def test_large_scan_yields_to_event_loop(self):
+        ticks = []
+
+        async def ticker(done):
+            while not done.is_set():
+                ticks.append(len(ticks))
+                await asyncio.sleep(0)
+
+        async def scan():
+            done = asyncio.Event()
+            task = asyncio.create_task(ticker(done))
+            await asyncio.sleep(0)
+            count = len([a async for a in async_quadtree.iter_all_points(self.qt, yield_every=100)])
+            progress = len(ticks)
+            done.set()
+            await task
+            return count, progress
+
+        count, progress = asyncio.run(scan())
+        self.assertEqual(2000, count)
+        self.assertGreaterEqual(progress, 2000 // 100)
+
+    def test_offload_runs_query_in_executor(self):
+        async def offloaded():
+            return await async_quadtree.offload(self.qt.count_range_query, 10, 10, 30, 40)
+
+        self.assertEqual(self.qt.count_range_query(10, 10, 30, 40), asyncio.run(offloaded()))
+
+
+class PointLoaderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.points = [p((i * 37) % 101, (i * 53) % 97) for i in range(500)]
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_binary_file_in_one_chunk_builds_bulk_loaded_tree(self):
+        path = os.path.join(self.directory.name, 'points.bin')
+        write_binary_points(self.points, path)
+        self.assertEqual(str(QuadTree.from_points(self.points)), str(load_points(path)))
+
+    def test_csv_file_in_chunks(self):
+        path = os.path.join(self.directory.name, 'points.csv')
+        with open(path, 'w') as f:
+            f.write('x,y\n')
+            f.writelines(str(a.x) + ',' + str(a.y) + '\n' for a in self.points)
+        progress = []
+        qt = load_points(path, chunk_size=64, skip_header=True, progress=lambda n, _: progress.append(n))
+        self.assertEqual(sorted(set((a.x, a.y) for a in self.points)),
+                         sorted((a.x, a.y) for a in qt.range_query(0, 0, 100, 100)))
+        self.assertEqual(list(range(64, 500, 64)) + [500], progress)
+        self.assertLessEqual(tree_depth(qt), 20)
+
+    def test_parsing_without_numpy_gives_the_same_chunks_and_tree(self):
+        path = os.path.join(self.directory.name, 'points.csv')
+        with open(path, 'w') as f:
+            f.write('x;y\n\n')
+            f.writelines(str(a.x) + ';"' + str(a.y) + '"\n' for a in self.points)
+        loads = []
+        for numpy_module in (point_loader.np, None):
+            with mock.patch.object(point_loader, 'np', numpy_module):
+                loads.append(([len(xs) for xs, _ in point_loader.iter_csv_coordinates(path, 64, delimiter=';',
+                                                                                      skip_header=True)],
+                              str(load_points(path, chunk_size=64, delimiter=';', skip_header=True))))
+        self.assertEqual(loads[0], loads[1])
+        self.assertEqual([64] * 7 + [52], loads[0][0])
+
+    def test_load_into_existing_tree(self):
+        path = os.path.join(self.directory.name, 'points.bin')
+        write_binary_points([(200, 200), (201, 201)], path)
+        qt = QuadTree.from_points(self.points)
+        load_points(path, tree=qt, file_format='binary', chunk_size=1)
+        self.assertEqual(p(201, 201), qt.search(p(201, 201)).point)
+
+    def test_load_into_new_tree_of_tree_class(self):
+        path = os.path.join(self.directory.name, 'points.bin')
+        write_binary_points(self.points, path)
+        bqt = load_points(path, chunk_size=100, tree_class=BalancedQuadTree)
+        self.assertIsInstance(bqt, BalancedQuadTree)
+        self.assertEqual(sorted(set((a.x, a.y) for a in self.points)),
+                         sorted((a.x, a.y) for a in bqt.range_query(0, 0, 100, 100)))
+        self.assertEqual(1, load_points(path, tree_class=MultisetQuadTree).count(self.points[7]))
+
+    def test_truncated_binary_file(self):
+        path = os.path.join(self.directory.name, 'points.bin')
+        with open(path, 'wb') as f:
+            f.write(b'\0' * 20)
+        with self.assertRaises(ValueError):
+            load_points(path)
+
+
+class MortonQuadTreesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.points = [p((i * 37) % 101, (i * 53) % 97) for i in range(2000)]
+        self.qt = QuadTree.from_points(self.points)
+        self.mqt = MortonQuadTree.from_points(self.points, bits=8)
+
+    def test_morton_code_interleaves_bits(self):
+        self.assertEqual(0, morton_code(0, 0))
+        self.assertEqual(0b01, morton_code(1, 0))
+        self.assertEqual(0b10, morton_code(0, 1))
+        self.assertEqual(0b111001, morton_code(0b101, 0b110))
+
+    def test_empty_tree(self):
+        mqt = MortonQuadTree.from_points([])
+        self.assertEqual(0, len(mqt))
+        self.assertIsNone(mqt.search(p(0, 0)))
+        self.assertEqual([], mqt.range_query(0, 0, 1, 1))
+        self.assertEqual([], mqt.nearest(p(0, 0)))
+
+    def test_search(self):
+        self.assertEqual(len(set(self.points)), len(self.mqt))
+        for pt in self.points[:100]:
+            self.assertEqual(pt, self.mqt.search(pt))
+        self.assertIsNone(self.mqt.search(p(0.5, 0.5)))
+        self.assertIsNone(self.mqt.search(p(500, 500)))
+
+    def test_range_query_matches_quadtree(self):
+        for box in [(10, 10, 30, 40), (0, 0, 100, 100), (50, 0, 50, 96), (-10, -10, -1, -1), (20.5, 3, 21.5, 90)]:
+            self.assertEqual(sorted((r.x, r.y) for r in self.qt.range_query(*box)),
+                             sorted((r.x, r.y) for r in self.mqt.range_query(*box)))
+            self.assertEqual(self.qt.count_range_query(*box), self.mqt.count_range_query(*box))
+
+    def test_nearest_matches_quadtree(self):
+        for query in [p(50.5, 50.5), p(-20, 3), p(0, 0), p(99.9, 12.2)]:
+            self.assertEqual([QuadTree._compute_l2(query, a) for a in self.qt.nearest(query, k=7)],
+                             [QuadTree._compute_l2(query, a) for a in self.mqt.nearest(query, k=7)])
+        self.assertEqual(sorted((a.x, a.y) for a in self.qt.within_radius(p(40, 40), 6, metric='l1')),
+                         sorted((a.x, a.y) for a in self.mqt.within_radius(p(40, 40), 6, metric='l1')))
+
+
+class CachedQuadTreesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cqt = CachedQuadTree(QuadTree.from_points([p(x, y) for x in range(10) for y in range(10)]))
+
+    def test_repeated_queries_hit_the_cache(self):
+        first = self.cqt.range_query(1, 1, 3, 3)
+        first.append(p(100, 100))
+        self.assertEqual(9, len(self.cqt.range_query(1, 1, 3, 3)))
+        self.assertEqual([p(5, 5)], self.cqt.nearest(p(5.1, 5.1)))
+        self.assertEqual([p(5, 5)], self.cqt.nearest(p(5.1, 5.1)))
+        info = self.cqt.cache_info()
+        self.assertEqual((2, 2, 2), (info.hits, info.misses, info.currsize))
+
+    def test_updates_only_drop_entries_covering_the_point(self):
+        self.cqt.range_query(0, 0, 2, 2)
+        self.cqt.count_range_query(6, 6, 9, 9)
+        self.cqt.nearest(p(8.2, 8.2), k=2)
+        self.cqt.within_radius(p(1, 1), 1.5)
+        self.cqt.delete_with_partial_reinsertion(p(1, 2))
+        self.assertEqual(2, self.cqt.cache_info().invalidations)
+        self.assertEqual(8, len(self.cqt.range_query(0, 0, 2, 2)))
+        self.cqt.insert(p(8.1, 8.1))
+        self.assertEqual([p(8.1, 8.1), p(8, 8)], self.cqt.nearest(p(8.2, 8.2), k=2))
+        self.assertEqual(17, self.cqt.count_range_query(6, 6, 9, 9))
+        self.cqt.delete_with_full_reinsertion(p(50, 50))
+        self.cqt.insert(p(8, 8))
+        self.assertEqual(4, self.cqt.cache_info().invalidations)
+
+    def test_updates_find_entries_of_any_size_and_unbounded_ones(self):
+        self.cqt.count_range_query(4.5, 4.5, 4.5, 4.5)
+        self.cqt.count_range_query(-1000, -1000, 1000, 1000)
+        self.cqt.count_range_query(4, 4, math.inf, 5)
+        self.cqt.nearest(p(4.5, 4.5), k=200)
+        self.cqt.nearest(p(4.5, 4.5), metric=lambda a, b: abs(a.x - b.x) / 2)
+        self.cqt.count_range_query(0, 0, 1e-9, 1e-9)
+        self.cqt.insert(p(4.5, 4.5))
+        self.assertEqual((5, 1), (self.cqt.cache_info().invalidations, self.cqt.cache_info().currsize))
+        self.assertEqual(1, self.cqt.count_range_query(4.5, 4.5, 4.5, 4.5))
+        self.cqt.cache_clear()
+        self.assertEqual(({}, set()), (self.cqt._grid, self.cqt._unbounded))
+
+    def test_lru_eviction_and_ttl(self):
+        cqt = CachedQuadTree(QuadTree.from_points([p(1, 1)]), maxsize=2)
+        for box in [(0, 0, 1, 1), (0, 0, 2, 2), (0, 0, 1, 1), (0, 0, 3, 3), (0, 0, 1, 1), (0, 0, 2, 2)]:
+            cqt.count_range_query(*box)
+        self.assertEqual((2, 4, 2), (cqt.hits, cqt.misses, cqt.cache_info().currsize))
+        cqt = CachedQuadTree(QuadTree.from_points([p(1, 1)]), ttl=0)
+        cqt.count_range_query(0, 0, 1, 1)
+        cqt.count_range_query(0, 0, 1, 1)
+        self.assertEqual((0, 2), (cqt.hits, cqt.misses))
+
+
+class InstrumentedQuadTreesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.qt = QuadTree()
+        for x, y in ArrayQuadTreesTest._PAPER_POINTS:
+            self.qt.insert(p(x, y))
+
+    def test_stats_do_not_change_results_and_can_be_disabled(self):
+        plain = self.qt.clone()
+        self.qt.enable_stats()
+        for qt in (plain, self.qt):
+            qt.insert(p(90, 90))
+            qt.delete_with_partial_reinsertion(p(50, 50))
+            qt.delete_with_full_reinsertion(p(66, 66))
+        self.assertEqual(str(plain), str(self.qt))
+        self.qt.disable_stats()
+        self.assertEqual({QuadTree}, {type(node) for node in [self.qt] + self.qt.get_all_child_points()})
+
+    def test_operation_counters_and_phases(self):
+        seen = []
+        recorder = self.qt.enable_stats()
+        recorder.add_callback(seen.append)
+        self.qt.search(p(61, 54))
+        self.assertEqual(4, recorder.last.nodes_visited)
+        self.assertEqual(4, recorder.last.max_depth)
+        self.qt.delete_with_partial_reinsertion(p(50, 50))
+        stats = recorder.last
+        self.assertEqual('delete_with_partial_reinsertion', stats.name)
+        self.assertGreater(stats.reinserted, 0)
+        self.assertTrue({'select_candidate', 'adj', 'reinsert'} <= set(stats.phases_ns))
+        self.assertEqual(stats.total_ns, sum(stats.phases_ns.values()))
+        self.qt.insert(p(1, 1))
+        self.qt.insert(p(2, 2))
+        self.assertEqual(['search', 'delete_with_partial_reinsertion', 'insert', 'insert'], [s.name for s in seen])
+        self.assertEqual(2, recorder.totals['insert'].count)
+        self.assertEqual(0, recorder.totals['insert'].reinserted)
+
+    def test_scans_count_visited_nodes(self):
+        recorder = self.qt.enable_stats()
+        nodes = 1 + len(self.qt.get_all_child_points())
+        self.assertEqual(nodes, self.qt.count_range_query(0, 0, 100, 100))
+        self.assertEqual(nodes, recorder.last.nodes_visited)
+        self.qt.range_query(0, 0, 10, 10)
+        self.assertEqual('range_query', recorder.last.name)
+        self.assertGreater(recorder.last.nodes_visited, 0)
+        self.assertLess(recorder.last.nodes_visited, nodes)
+        self.qt.nearest(p(61, 54), k=nodes)
+        self.assertEqual(nodes, recorder.last.nodes_visited)
+        self.qt.within_radius(p(61, 54), 0)
+        self.assertGreater(recorder.last.nodes_visited, 0)
+
+    def test_lazy_delete_times_its_descent(self):
+        recorder = self.qt.enable_stats()
+        self.qt.delete_lazy(p(61, 54))
+        self.assertEqual('delete_lazy', recorder.last.name)
+        self.assertIn('descent', recorder.last.phases_ns)
+        self.assertEqual(4, recorder.last.nodes_visited)
+
+    def test_shape_stats(self):
+        shape = self.qt.shape_stats()
+        self.assertEqual(len(ArrayQuadTreesTest._PAPER_POINTS), shape['nodes'])
+        self.assertEqual(tree_depth(self.qt), shape['depth'])
+        self.assertEqual(shape['nodes'], sum(shape['depth_histogram']))
+        self.assertEqual([0, 0, 0, 0, 1], shape['fanout'][0])
+        self.assertEqual(shape['depth_histogram'], [sum(level) for level in shape['fanout']])
+        self.assertEqual({'nodes': 0, 'deleted': 0, 'depth': 0, 'depth_histogram': [], 'fanout': []},
+                         QuadTree().shape_stats())
+
+
+class MultisetQuadTreesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.mqt = MultisetQuadTree()
+        for x, y in ArrayQuadTreesTest._PAPER_POINTS:
+            self.mqt.insert(Point(x, y, 'first'))
+
+    def test_duplicates_keep_their_payloads(self):
+        self.mqt.insert(Point(61, 54, 'second'))
+        self.mqt.insert(Point(61, 54, 'third'))
+        self.assertEqual(['first', 'second', 'third'], self.mqt.payloads_at(p(61, 54)))
+        self.assertEqual(3, self.mqt.count(p(61, 54)))
+        self.assertEqual(0, self.mqt.count(p(61, 55)))
+        self.assertEqual(len(ArrayQuadTreesTest._PAPER_POINTS), 1 + len(self.mqt.get_all_child_points()))
+        self.assertEqual(['first', 'second', 'third'],
+                         [r.payload for r in self.mqt.range_query_records(60, 50, 62, 55)])
+
+    def test_range_query_records_walks_the_nodes_once(self):
+        self.mqt.insert(Point(50, 50, 'again'))
+        self.mqt.delete_lazy(p(61, 54))
+        with mock.patch.object(MultisetQuadTree, 'search', side_effect=AssertionError):
+            records = self.mqt.range_query_records(0, 0, 100, 100)
+        self.assertEqual(len(ArrayQuadTreesTest._PAPER_POINTS), len(records))
+        self.assertEqual(['first', 'again'], [r.payload for r in records if r == p(50, 50)])
+
+    def test_bulk_load_keeps_duplicates(self):
+        mqt = MultisetQuadTree.from_points([Point(1, 1, 'a'), Point(2, 2, 'b'), Point(1, 1, 'c')])
+        self.assertEqual(['a', 'c'], mqt.payloads_at(p(1, 1)))
+        self.assertEqual(3, len(mqt.range_query_records(0, 0, 3, 3)))
+
+    def test_delete_removes_one_payload_without_restructuring(self):
+        self.mqt.insert(Point(50, 50, 'second'))
+        shape = str(self.mqt)
+        self.mqt.delete_with_partial_reinsertion(Point(50, 50, 'first'))
+        self.assertEqual(shape, str(self.mqt))
+        self.assertEqual('second', self.mqt.search(p(50, 50)).point.payload)
+        self.mqt.delete_with_partial_reinsertion(Point(50, 50, 'missing'))
+        self.assertEqual(['second'], self.mqt.payloads_at(p(50, 50)))
+        self.mqt.delete_with_partial_reinsertion(p(50, 50))
+        self.assertIsNone(self.mqt.search(p(50, 50)))
+
+    def test_tree_surgery_carries_payloads(self):
+        for x, y in ArrayQuadTreesTest._PAPER_POINTS:
+            self.mqt.insert(Point(x, y, 'second'))
+        self.mqt.delete_with_partial_reinsertion(p(50, 50))
+        self.mqt.delete_with_partial_reinsertion(p(50, 50))
+        self.mqt.delete_with_full_reinsertion(p(66, 66))
+        self.mqt.delete_with_full_reinsertion(p(66, 66))
+        for x, y in ArrayQuadTreesTest._PAPER_POINTS:
+            if (x, y) not in [(50, 50), (66, 66)]:
+                self.assertEqual(['first', 'second'], self.mqt.payloads_at(p(x, y)))
+
+    def test_lazy_delete_compact_and_clone(self):
+        self.mqt.insert(Point(61, 54, 'second'))
+        copy_of_tree = self.mqt.clone()
+        self.mqt.delete_lazy(p(61, 54))
+        self.mqt.delete_lazy(p(50, 50))
+        self.assertEqual(['first'], self.mqt.payloads_at(p(61, 54)))
+        self.assertIsNone(self.mqt.search(p(50, 50)))
+        self.mqt.insert(Point(50, 50, 'again'))
+        self.assertEqual(['again'], self.mqt.payloads_at(p(50, 50)))
+        self.mqt.delete_lazy(p(50, 50))
+        self.mqt.compact()
+        self.assertEqual(['first'], self.mqt.payloads_at(p(61, 54)))
+        self.assertEqual(['first', 'second'], copy_of_tree.payloads_at(p(61, 54)))
+
 
 if __name__ == '__main__':
     unittest.main()